@@ -1,5 +1,87 @@
-from django.http import HttpResponse
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import HttpResponse, JsonResponse
+
+from apps.shared.snapshot import registry
 
 
 def health_check(response):
     return HttpResponse("OK", status=200)
+
+
+class DatabasePing:
+    """
+    Whether the database answered a SELECT 1, checked at most once every interval seconds
+    however often it is asked. While one check runs, other callers get the last result
+    instead of waiting on it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pinging = False
+        self.reachable = None
+        self.error = None
+        self.checked_at = 0
+
+    @property
+    def interval(self):
+        return getattr(settings, 'HEALTHCHECK_DB_PING_INTERVAL', 10)
+
+    def check(self):
+        with self._lock:
+            ping = not self._pinging and time.monotonic() - self.checked_at >= self.interval
+            self._pinging = self._pinging or ping
+        if ping:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                self.reachable, self.error = True, None
+            except DatabaseError as error:
+                self.reachable, self.error = False, str(error)
+            finally:
+                with self._lock:
+                    self.checked_at = time.monotonic()
+                    self._pinging = False
+        return {
+            'reachable': self.reachable,
+            'error': self.error,
+            'checked': round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.reachable = self.error = None
+            self.checked_at = 0
+
+
+database_ping = DatabasePing()
+
+
+def liveness(request):
+    """The process is up and serving requests. Touches neither the database nor the snapshot."""
+    return HttpResponse("OK", status=200)
+
+
+def readiness(request):
+    """
+    Ready once the reference data snapshot is loaded with its bootstrap bundle built, so
+    that /api/bootstrap/ is answered from memory; until then 503, and a load is started
+    in the background if none is running. The database isn't required: a pod holding a
+    stale snapshot while the database is down keeps serving it, but the report says so.
+    """
+    snapshot = registry.status()
+    ready = snapshot['loaded'] and snapshot['bootstrap_ready']
+    if not ready:
+        registry.warm_in_background()
+    return JsonResponse(
+        {
+            'ready': ready,
+            'database': database_ping.check(),
+            'snapshot': snapshot,
+            'coalescing': registry.flight_stats(),
+        },
+        status=200 if ready else 503,
+    )
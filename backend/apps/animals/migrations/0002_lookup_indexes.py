@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animalsubtype',
+            index=models.Index(fields=['animalid'], name='animalsubtype_animal_idx'),
+        ),
+    ]
@@ -26,6 +26,7 @@ class AnimalSubtype(models.Model):
     class Meta:
         managed = True
         db_table = 'animal_subtype'
+        indexes = [models.Index(fields=['animalid'], name='animalsubtype_animal_idx')]
 
 
 class Breed(models.Model):
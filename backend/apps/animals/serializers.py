@@ -1,21 +1,21 @@
-from rest_framework import serializers
+from apps.shared.serializers import ValuesListModelSerializer
 
 from .models import Animals, AnimalSubtype, Breed
 
 
-class AnimalsSerializer(serializers.ModelSerializer):
+class AnimalsSerializer(ValuesListModelSerializer):
     class Meta:
         model = Animals
         fields = '__all__'
 
 
-class AnimalSubtypeSerializer(serializers.ModelSerializer):
+class AnimalSubtypeSerializer(ValuesListModelSerializer):
     class Meta:
         model = AnimalSubtype
         fields = '__all__'
 
 
-class BreedSerializer(serializers.ModelSerializer):
+class BreedSerializer(ValuesListModelSerializer):
     class Meta:
         model = Breed
         fields = '__all__'
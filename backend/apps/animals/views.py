@@ -1,31 +1,20 @@
-from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.response import Response
 
-from .models import Animals, AnimalSubtype, Breed
-from .serializers import AnimalsSerializer, AnimalSubtypeSerializer, BreedSerializer
+from apps.shared.views import ReferenceViewset
 
 
-class AnimalsViewset(viewsets.ViewSet):
+class AnimalsViewset(ReferenceViewset):
 
     @action(detail=True, methods=['get'])
     def animals(self, request):
-        animals = Animals.objects.all()
-        serializer = AnimalsSerializer(animals, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.reference_response(request, 'animals')
 
     @action(detail=True, methods=['get'])
     def animalSubtypes(self, request, animalId=None):
-        animals = None
         if animalId is None:
-            animals = AnimalSubtype.objects.all()
-        else:
-            animals = AnimalSubtype.objects.filter(animalid=animalId)
-        serializer = AnimalSubtypeSerializer(animals, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.reference_response(request, 'animal_subtypes')
+        return self.reference_response(request, 'animal_subtypes', animalid=animalId)
 
     @action(detail=True, methods=['get'])
     def breeds(self, request):
-        breeds = Breed.objects.all()
-        serializer = BreedSerializer(breeds, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.reference_response(request, 'breeds')
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0007_rename_distancebetweenplants_berryquantities_distancebetweenplants_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cropsoilpotassiumregions',
+            index=models.Index(fields=['cropid', 'soiltestpotassiumregioncode'], name='cropsoilk_crop_region_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cropsoiltestphosphorousregions',
+            index=models.Index(fields=['cropid', 'soiltestphosphorousregioncode'], name='cropsoilp_crop_region_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cropyields',
+            index=models.Index(fields=['cropid', 'locationid'], name='cropyields_crop_location_idx'),
+        ),
+    ]
@@ -58,6 +58,7 @@ class CropSoilTestPhosphorousRegions(models.Model):
     class Meta:
         managed = True
         db_table = 'crop_soil_test_phosphorous_regions'
+        indexes = [models.Index(fields=['cropid', 'soiltestphosphorousregioncode'], name='cropsoilp_crop_region_idx')]
 
 
 class SoilTestPhosphorousRecommendation(models.Model):
@@ -169,6 +170,7 @@ class CropSoilPotassiumRegions(models.Model):
     class Meta:
         managed = True
         db_table = 'crop_soil_potassium_regions'
+        indexes = [models.Index(fields=['cropid', 'soiltestpotassiumregioncode'], name='cropsoilk_crop_region_idx')]
 
 
 class CropYields(models.Model):
@@ -180,6 +182,7 @@ class CropYields(models.Model):
     class Meta:
         managed = True
         db_table = 'crop_yields'
+        indexes = [models.Index(fields=['cropid', 'locationid'], name='cropyields_crop_location_idx')]
 
 
 class NitrogenRecommendation(models.Model):
@@ -1,4 +1,4 @@
-from rest_framework import serializers
+from apps.shared.serializers import ValuesListModelSerializer
 
 from .models import (
     CropTypes, Crops, PreviousCropTypes, CropSoilTestPhosphorousRegions, SoilTestPhosphorousRanges,
@@ -10,109 +10,109 @@ from .models import (
 )
 
 
-class CropTypesSerializer(serializers.ModelSerializer):
+class CropTypesSerializer(ValuesListModelSerializer):
     class Meta:
         model = CropTypes
         fields = '__all__'
 
 
-class CropsSerializer(serializers.ModelSerializer):
+class CropsSerializer(ValuesListModelSerializer):
     class Meta:
         model = Crops
         fields = '__all__'
 
 
-class PreviousCropTypesSerializer(serializers.ModelSerializer):
+class PreviousCropTypesSerializer(ValuesListModelSerializer):
     class Meta:
         model = PreviousCropTypes
         fields = '__all__'
 
 
-class CropSoilTestPhosphorousRegionsSerializer(serializers.ModelSerializer):
+class CropSoilTestPhosphorousRegionsSerializer(ValuesListModelSerializer):
     class Meta:
         model = CropSoilTestPhosphorousRegions
         fields = '__all__'
 
 
-class SoilTestPhosphorousRecommendationSerializer(serializers.ModelSerializer):
+class SoilTestPhosphorousRecommendationSerializer(ValuesListModelSerializer):
     class Meta:
         model = SoilTestPhosphorousRecommendation
         fields = '__all__'
 
 
-class SoilTestPhosphorousKelownaRangesSerializer(serializers.ModelSerializer):
+class SoilTestPhosphorousKelownaRangesSerializer(ValuesListModelSerializer):
     class Meta:
         model = SoilTestPhosphorousKelownaRanges
         fields = '__all__'
 
 
-class SoilTestPhosphorousRangesSerializer(serializers.ModelSerializer):
+class SoilTestPhosphorousRangesSerializer(ValuesListModelSerializer):
     class Meta:
         model = SoilTestPhosphorousRanges
         fields = '__all__'
 
 
-class SoilTestMethodsSerializer(serializers.ModelSerializer):
+class SoilTestMethodsSerializer(ValuesListModelSerializer):
     class Meta:
         model = SoilTestMethods
         fields = '__all__'
 
 
-class ConversionFactorsSerializer(serializers.ModelSerializer):
+class ConversionFactorsSerializer(ValuesListModelSerializer):
     class Meta:
         model = ConversionFactors
         fields = '__all__'
 
 
-class SoilTestPotassiumKelownaRangesSerializer(serializers.ModelSerializer):
+class SoilTestPotassiumKelownaRangesSerializer(ValuesListModelSerializer):
     class Meta:
         model = SoilTestPotassiumKelownaRanges
         fields = '__all__'
 
 
-class SoilTestPotassiumRangesSerializer(serializers.ModelSerializer):
+class SoilTestPotassiumRangesSerializer(ValuesListModelSerializer):
     class Meta:
         model = SoilTestPotassiumRanges
         fields = '__all__'
 
 
-class SoilTestPotassiumRecommendationSerializer(serializers.ModelSerializer):
+class SoilTestPotassiumRecommendationSerializer(ValuesListModelSerializer):
     class Meta:
         model = SoilTestPotassiumRecommendation
         fields = '__all__'
 
 
-class CropSoilPotassiumRegionsSerializer(serializers.ModelSerializer):
+class CropSoilPotassiumRegionsSerializer(ValuesListModelSerializer):
     class Meta:
         model = CropSoilPotassiumRegions
         fields = '__all__'
 
 
-class CropYieldsSerializer(serializers.ModelSerializer):
+class CropYieldsSerializer(ValuesListModelSerializer):
     class Meta:
         model = CropYields
         fields = '__all__'
 
 
-class NitrogenRecommendationSerializer(serializers.ModelSerializer):
+class NitrogenRecommendationSerializer(ValuesListModelSerializer):
     class Meta:
         model = NitrogenRecommendation
         fields = '__all__'
 
 
-class PlantAgeSerializer(serializers.ModelSerializer):
+class PlantAgeSerializer(ValuesListModelSerializer):
     class Meta:
         model = PlantAge
         fields = '__all__'
 
 
-class BerryQuantitiesSerializer(serializers.ModelSerializer):
+class BerryQuantitiesSerializer(ValuesListModelSerializer):
     class Meta:
         model = BerryQuantities
         fields = '__all__'
 
 
-class WhereWillPruningsGoSerializer(serializers.ModelSerializer):
+class WhereWillPruningsGoSerializer(ValuesListModelSerializer):
     class Meta:
         model = WhereWillPruningsGo
         fields = '__all__'
@@ -1,33 +1,33 @@
-from rest_framework import serializers
+from apps.shared.serializers import ValuesListModelSerializer
 
 from .models import Fertilizers, FertilizerTypes, FertilizerUnits, LiquidFertilizerDensities, DensityUnits
 
 
-class FertilizerTypesSerializer(serializers.ModelSerializer):
+class FertilizerTypesSerializer(ValuesListModelSerializer):
     class Meta:
         model = FertilizerTypes
         fields = '__all__'
 
 
-class FertilizerUnitsSerializer(serializers.ModelSerializer):
+class FertilizerUnitsSerializer(ValuesListModelSerializer):
     class Meta:
         model = FertilizerUnits
         fields = '__all__'
 
 
-class FertilizersSerializer(serializers.ModelSerializer):
+class FertilizersSerializer(ValuesListModelSerializer):
     class Meta:
         model = Fertilizers
         fields = '__all__'
 
 
-class LiquidFertilizerDensitiesSerializer(serializers.ModelSerializer):
+class LiquidFertilizerDensitiesSerializer(ValuesListModelSerializer):
     class Meta:
         model = LiquidFertilizerDensities
         fields = '__all__'
 
 
-class DensityUnitsSerializer(serializers.ModelSerializer):
+class DensityUnitsSerializer(ValuesListModelSerializer):
     class Meta:
         model = DensityUnits
         fields = '__all__'
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manures', '0009_rename_metrictonsoutput_solidmaterialsconversionfactors_ustonsoutput'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ammoniaretentions',
+            index=models.Index(fields=['seasonapplicationid', 'drymatter'], name='ammonia_season_drymatter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nitrogenmineralization',
+            index=models.Index(fields=['nmineralizationid', 'locationid'], name='nmineral_id_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='units',
+            index=models.Index(fields=['name'], name='units_name_idx'),
+        ),
+    ]
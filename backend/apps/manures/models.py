@@ -67,6 +67,7 @@ class Units(models.Model):
     class Meta:
         managed = True
         db_table = 'units'
+        indexes = [models.Index(fields=['name'], name='units_name_idx')]
 
 
 class NitrogenMineralization(models.Model):
@@ -80,6 +81,7 @@ class NitrogenMineralization(models.Model):
     class Meta:
         managed = True
         db_table = 'nitrogen_mineralization'
+        indexes = [models.Index(fields=['nmineralizationid', 'locationid'], name='nmineral_id_location_idx')]
 
 
 class AmmoniaRetentions(models.Model):
@@ -91,6 +93,7 @@ class AmmoniaRetentions(models.Model):
     class Meta:
         managed = True
         db_table = 'ammonia_retentions'
+        indexes = [models.Index(fields=['seasonapplicationid', 'drymatter'], name='ammonia_season_drymatter_idx')]
 
 
 class PreviousYearManureApplications(models.Model):
@@ -1,4 +1,4 @@
-from rest_framework import serializers
+from apps.shared.serializers import ValuesListModelSerializer
 
 from .models import (
     Manures, SolidMaterialsConversionFactors, LiquidMaterialsConversionFactors,
@@ -7,55 +7,55 @@ from .models import (
 )
 
 
-class ManuresSerializer(serializers.ModelSerializer):
+class ManuresSerializer(ValuesListModelSerializer):
     class Meta:
         model = Manures
         fields = '__all__'
 
 
-class SolidMaterialsConversionFactorsSerializer(serializers.ModelSerializer):
+class SolidMaterialsConversionFactorsSerializer(ValuesListModelSerializer):
     class Meta:
         model = SolidMaterialsConversionFactors
         fields = '__all__'
 
 
-class LiquidMaterialsConversionFactorsSerializer(serializers.ModelSerializer):
+class LiquidMaterialsConversionFactorsSerializer(ValuesListModelSerializer):
     class Meta:
         model = LiquidMaterialsConversionFactors
         fields = '__all__'
 
 
-class UnitsSerializer(serializers.ModelSerializer):
+class UnitsSerializer(ValuesListModelSerializer):
     class Meta:
         model = Units
         fields = '__all__'
 
 
-class NMineralizationSerializer(serializers.ModelSerializer):
+class NMineralizationSerializer(ValuesListModelSerializer):
     class Meta:
         model = NitrogenMineralization
         fields = '__all__'
 
 
-class AmmoniaRetentionSerializer(serializers.ModelSerializer):
+class AmmoniaRetentionSerializer(ValuesListModelSerializer):
     class Meta:
         model = AmmoniaRetentions
         fields = '__all__'
 
 
-class PreviousYearManureApplicationsSerializer(serializers.ModelSerializer):
+class PreviousYearManureApplicationsSerializer(ValuesListModelSerializer):
     class Meta:
         model = PreviousYearManureApplications
         fields = '__all__'
 
 
-class LiquidMaterialApplicationUsGallonsPerAcreRateConversionsSerializer(serializers.ModelSerializer):
+class LiquidMaterialApplicationUsGallonsPerAcreRateConversionsSerializer(ValuesListModelSerializer):
     class Meta:
         model = LiquidMaterialApplicationUsGallonsPerAcreRateConversions
         fields = '__all__'
 
 
-class SolidMaterialApplicationTonPerAcreRateConversionsSerializer(serializers.ModelSerializer):
+class SolidMaterialApplicationTonPerAcreRateConversionsSerializer(ValuesListModelSerializer):
     class Meta:
         model = SolidMaterialApplicationTonPerAcreRateConversions
         fields = '__all__'
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class SharedConfig(AppConfig):
+    name = 'apps.shared'
+
+    def ready(self):
+        from .snapshot import connect_signals  # pylint: disable=import-outside-toplevel
+        connect_signals()
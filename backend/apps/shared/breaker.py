@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class CircuitOpenError(DatabaseError):
+    """Raised in place of a database call while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a database that keeps failing. failure_threshold failed calls in a row
+    open the breaker, and so do calls that succeed but take longer than slow_call seconds.
+    While it is open, call() raises CircuitOpenError straight away. reset_timeout seconds
+    after it opened one trial call is let through: success closes the breaker, failure
+    opens it for another reset_timeout.
+    """
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30, slow_call=5):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._trial or self.retry_after() > 0:
+            return 'open'
+        return 'half-open'
+
+    def retry_after(self):
+        """Seconds until the breaker lets a trial call through, 0 if it would now."""
+        if self._opened_at is None:
+            return 0
+        return max(0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    @contextmanager
+    def call(self):
+        with self._lock:
+            if self._opened_at is not None:
+                if self._trial or self.retry_after() > 0:
+                    raise CircuitOpenError('The %s circuit breaker is open' % self.name)
+                self._trial = True
+        start = time.monotonic()
+        try:
+            yield
+        except DatabaseError:
+            self._record(failed=True)
+            raise
+        except BaseException:
+            # Not the database's fault, so neither a failure nor a success
+            with self._lock:
+                self._trial = False
+            raise
+        self._record(failed=time.monotonic() - start > self.slow_call)
+
+    def iterate(self, rows):
+        """
+        Yields rows read lazily from the database, like a streamed queryset's. Running the
+        query, up to the first row, is a call(); a database error after it is a failure too.
+        Reading the rest isn't timed, since that goes at the pace of the client.
+        """
+        rows = iter(rows)
+        with self.call():
+            row = next(rows, _END)
+        if row is _END:
+            return
+        yield row
+        try:
+            yield from rows
+        except DatabaseError:
+            self._record(failed=True)
+            raise
+
+    async def aiterate(self, rows):
+        """iterate() for an async iterator of rows."""
+        rows = aiter(rows)
+        with self.call():
+            row = await anext(rows, _END)
+        if row is _END:
+            return
+        yield row
+        try:
+            async for row in rows:
+                yield row
+        except DatabaseError:
+            self._record(failed=True)
+            raise
+
+    def reset(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def _record(self, failed):
+        with self._lock:
+            self._trial = False
+            if not failed:
+                if self._opened_at is not None:
+                    logger.info('The %s circuit breaker closed', self.name)
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning('The %s circuit breaker opened after %s failed or slow calls',
+                                   self.name, self._failures)
+                self._opened_at = time.monotonic()
@@ -0,0 +1,76 @@
+import threading
+import time
+
+
+class AdaptiveLimiter:
+    """
+    Caps the requests a worker handles at once, adapting the cap by AIMD: it grows by one
+    for about every cap's worth of requests that finish within latency_target seconds, and
+    shrinks by backoff when one takes longer (at most once per latency_target, so that a
+    burst of slow requests isn't counted as many signals).
+
+    Cheap requests may fill the whole cap. Expensive ones leave the top reserve share of it
+    free, so they can't crowd out the cheap requests.
+    """
+
+    backoff = 0.9
+    reserve = 0.25
+
+    def __init__(self, initial_limit=20, min_limit=2, max_limit=200, latency_target=0.25):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+        self._last_decrease = 0
+
+    def capacity(self, cheap):
+        limit = int(self.limit)
+        return limit if cheap else max(1, int(limit * (1 - self.reserve)))
+
+    def try_acquire(self, cheap):
+        with self._condition:
+            return self._try_acquire(cheap)
+
+    def acquire(self, cheap, timeout):
+        """Takes a slot, waiting up to timeout seconds for one. False if none came free."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._try_acquire(cheap):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def reject(self):
+        """Counts a request turned away after try_acquire() failed for too long."""
+        with self._condition:
+            self.rejected += 1
+
+    def release(self, latency=None):
+        """Frees a slot, adapting the cap to latency if the request was a cheap one."""
+        with self._condition:
+            self.in_flight -= 1
+            if latency is not None:
+                self._adapt(latency)
+            # A slot an expensive waiter can't take may still do for a cheap one, so wake them all
+            self._condition.notify_all()
+
+    def _try_acquire(self, cheap):
+        if self.in_flight >= self.capacity(cheap):
+            return False
+        self.in_flight += 1
+        return True
+
+    def _adapt(self, latency):
+        if latency <= self.latency_target:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            return
+        now = time.monotonic()
+        if now - self._last_decrease >= self.latency_target:
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit * self.backoff)
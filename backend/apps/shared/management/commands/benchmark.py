@@ -0,0 +1,247 @@
+import gzip
+import time
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+from apps.shared.renderers import msgpack, render_msgpack
+from apps.shared.snapshot import registry, render_json
+from apps.shared.throttling import TokenBucketThrottle
+from apps.shared.views import ReferenceViewset, reference_route
+
+
+# Columns the filtered reference routes look rows up by, which have an index each
+LOOKUPS = (
+    ('crops.CropSoilTestPhosphorousRegions', ('cropid', 'soiltestphosphorousregioncode')),
+    ('crops.CropSoilPotassiumRegions', ('cropid', 'soiltestpotassiumregioncode')),
+    ('crops.CropYields', ('cropid', 'locationid')),
+    ('manures.NitrogenMineralization', ('nmineralizationid', 'locationid')),
+    ('manures.AmmoniaRetentions', ('seasonapplicationid', 'drymatter')),
+    ('manures.Units', ('name',)),
+    ('shared.Subregion', ('regionid',)),
+    ('animals.AnimalSubtype', ('animalid',)),
+)
+
+FAST_LANE_MIDDLEWARE = 'apps.shared.middleware.ReferenceFastLaneMiddleware'
+
+
+def _time(func, iterations):
+    """Best wall-clock time of a single call, in seconds."""
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks reference data serving against the configured database'
+
+    suites = ('serializers', 'renderers', 'indexes', 'middleware', 'throttles')
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=self.suites)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--tables', help='Comma separated endpoint names, defaults to every table')
+        parser.add_argument('--scale', type=int, default=100, help='Table growth factor for the indexes suite')
+
+    def handle(self, *args, **options):
+        names = list(registry.serializers)
+        if options['tables']:
+            names = options['tables'].split(',')
+            unknown = set(names) - set(registry.serializers)
+            if unknown:
+                raise CommandError('Unknown tables: %s' % ', '.join(sorted(unknown)))
+        self.scale = options['scale']
+        self.verbosity = options['verbosity']
+        getattr(self, 'benchmark_%s' % options['suite'])(names, options['iterations'])
+
+    def benchmark_serializers(self, names, iterations):
+        """ModelSerializer(many=True) against the values_list() path, both rendered to JSON bytes."""
+        self.stdout.write('%-58s %6s %14s %14s %8s %9s' % (
+            'table', 'rows', 'drf rows/s', 'values rows/s', 'speedup', 'identical'))
+        for name in names:
+            serializer_class = registry.serializers[name]
+            queryset = serializer_class.Meta.model.objects.order_by('pk')
+
+            def drf(serializer_class=serializer_class, queryset=queryset):
+                return render_json(serializer_class(queryset.all(), many=True).data)
+
+            def values(serializer_class=serializer_class, queryset=queryset):
+                return render_json(serializer_class.serialize_queryset(queryset.all()))
+
+            rows = queryset.count()
+            drf_time = _time(drf, iterations)
+            values_time = _time(values, iterations)
+            self.stdout.write('%-58s %6d %14.0f %14.0f %7.1fx %9s' % (
+                name, rows, rows / drf_time, rows / values_time, drf_time / values_time,
+                'yes' if drf() == values() else 'NO'))
+
+    def benchmark_renderers(self, names, iterations):
+        """JSON against MessagePack encoding of each snapshot table: encode time and body size."""
+        if msgpack is None:
+            raise CommandError('msgpack is not installed')
+        self.stdout.write('%-58s %6s %9s %9s %9s %9s %9s %9s' % (
+            'table', 'rows', 'json ms', 'mpack ms', 'json B', 'mpack B', 'json gz', 'mpack gz'))
+        for name in names:
+            rows = registry.table(name).rows
+            json_content = render_json(rows)
+            msgpack_content = render_msgpack(rows)
+            self.stdout.write('%-58s %6d %9.3f %9.3f %9d %9d %9d %9d' % (
+                name, len(rows),
+                _time(lambda rows=rows: render_json(rows), iterations) * 1000,
+                _time(lambda rows=rows: render_msgpack(rows), iterations) * 1000,
+                len(json_content), len(msgpack_content),
+                len(gzip.compress(json_content, mtime=0)), len(gzip.compress(msgpack_content, mtime=0))))
+
+    def benchmark_indexes(self, names, iterations):
+        """
+        Grows each LOOKUPS table --scale times, then times its lookup and shows the first line
+        of its EXPLAIN plan without and with the index. Everything runs in one transaction that
+        is rolled back, so the database is left as it was.
+        """
+        models = {registry.serializers[name].Meta.model for name in names}
+        self.stdout.write('%-32s %8s %7s %10s %10s  %s' % ('table', 'rows', 'matches', 'no idx ms', 'idx ms', 'plan'))
+        # Like migrate, SQLite can only alter tables in a transaction with foreign key checks off
+        connection.disable_constraint_checking()
+        try:
+            with transaction.atomic():
+                for label, columns in LOOKUPS:
+                    model = apps.get_model(label)
+                    if model in models:
+                        self._benchmark_index(model, columns, iterations)
+                transaction.set_rollback(True)
+        finally:
+            connection.enable_constraint_checking()
+
+    def _benchmark_index(self, model, columns, iterations):
+        sample = model.objects.order_by('pk').first()
+        if sample is None:
+            self.stdout.write('%-32s no rows, load the fixtures first' % model._meta.db_table)
+            return
+        self._scale_table(model, columns[0])
+        index = next(index for index in model._meta.indexes if tuple(index.fields) == columns)
+        queryset = model.objects.filter(**{column: getattr(sample, column) for column in columns})
+        results = []
+        for add_index in (False, True):
+            with connection.schema_editor() as schema_editor:
+                if add_index:
+                    schema_editor.add_index(model, index)
+                else:
+                    schema_editor.remove_index(model, index)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE %s' % connection.ops.quote_name(model._meta.db_table))
+            plan = queryset.explain()
+            results.append((_time(lambda: list(queryset.values_list('pk')), iterations) * 1000, plan))
+        self.stdout.write('%-32s %8d %7d %10.3f %10.3f  %s' % (
+            model._meta.db_table, model.objects.count(), queryset.count(), results[0][0], results[1][0],
+            ' '.join(results[1][1].splitlines()[0].split())[:60]))
+        if self.verbosity > 1:
+            for state, (_, plan) in zip(('without index', 'with index'), results):
+                self.stdout.write('  %s:\n    %s' % (state, plan.replace('\n', '\n    ')))
+
+    def _scale_table(self, model, column):
+        """
+        Adds scale - 1 copies of every row, with column shifted so that each copy has its own
+        values: lookups match as many rows as before while the table grows.
+        """
+        rows = list(model.objects.order_by('pk'))
+        pk_span = max(row.pk for row in rows) + 1
+        is_text = isinstance(getattr(rows[0], column), str)
+        span = 0 if is_text else max(getattr(row, column) for row in rows) + 1
+        fields = [field.attname for field in model._meta.concrete_fields]
+        copies = []
+        for copy in range(1, self.scale):
+            for row in rows:
+                values = {name: getattr(row, name) for name in fields}
+                values[model._meta.pk.attname] = row.pk + copy * pk_span
+                values[column] = '%s #%s' % (values[column], copy) if is_text else values[column] + copy * span
+                copies.append(model(**values))
+        model.objects.bulk_create(copies, batch_size=5000)
+
+    def benchmark_middleware(self, names, iterations):
+        """
+        Time per request for each table route through the middleware and authentication the
+        API used before the fast lane, through the fast lane, and calling the view directly.
+        The overhead columns are the first two less the view's own time.
+        """
+        legacy_middleware = [name for name in settings.MIDDLEWARE if name != FAST_LANE_MIDDLEWARE]
+        with override_settings(MIDDLEWARE=legacy_middleware):
+            legacy = BaseHandler()
+            legacy.load_middleware()
+        fast_lane = BaseHandler()
+        fast_lane.load_middleware()
+        registry.get()
+        self.stdout.write('%-58s %9s %9s %9s %9s %9s' % (
+            'table', 'full us', 'fast us', 'view us', 'full +us', 'fast +us'))
+        for name in names:
+            path = '/api/%s/' % name
+            # Before the fast lane the viewsets also ran DRF's default session and token authentication
+            ReferenceViewset.authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            try:
+                legacy_time = self._time_request(path, legacy, iterations)
+            finally:
+                ReferenceViewset.authentication_classes = ()
+            fast_lane_time = self._time_request(path, fast_lane, iterations)
+            view_time = self._time_request(path, None, iterations)
+            self.stdout.write('%-58s %9.1f %9.1f %9.1f %9.1f %9.1f' % (
+                name, legacy_time, fast_lane_time, view_time, legacy_time - view_time, fast_lane_time - view_time))
+
+    @staticmethod
+    def _time_request(path, handler, iterations):
+        """Microseconds for a GET of path through handler, or straight into its view without one."""
+        # RequestFactory's default Host, testserver, isn't in ALLOWED_HOSTS
+        factory = RequestFactory(HTTP_HOST='localhost')
+        match = reference_route(path)
+
+        def request():
+            if handler is not None:
+                return handler.get_response(factory.get(path))
+            response = match.func(factory.get(path), *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+        response = request()
+        if response.status_code != 200:
+            raise CommandError('GET %s returned %s' % (path, response.status_code))
+        return _time(request, iterations) * 1e6
+
+    def benchmark_throttles(self, _names, iterations):
+        """
+        Time per throttle decision on /api/batch/ of the token buckets, kept in process and in
+        the default cache, against DRF's ScopedRateThrottle, which keeps request histories in
+        that cache. Every request is from a new client, like a crowd of browsers.
+        """
+        factory = RequestFactory()
+        view = SimpleNamespace(throttle_scope='batch')
+        candidates = (
+            ('token bucket, in process', TokenBucketThrottle, None),
+            ('token bucket, default cache', TokenBucketThrottle, 'default'),
+            ('drf scoped rate, default cache', ScopedRateThrottle, None),
+        )
+        self.stdout.write('%-32s %12s %9s' % ('throttle', 'us/decision', 'allowed'))
+        for number, (label, throttle_class, cache_alias) in enumerate(candidates):
+            requests = []
+            for client in range(iterations):
+                # A fresh address range per candidate, so no candidate sees another's clients
+                request = factory.post('/api/batch/', REMOTE_ADDR='10.%d.%d.%d' % (
+                    number, client >> 8 & 255, client & 255))
+                request.user = AnonymousUser()
+                # Parsed by CorsMiddleware on a real request, so leave it out of the timing
+                request.headers  # pylint: disable=pointless-statement
+                requests.append(request)
+            with override_settings(THROTTLE_CACHE=cache_alias):
+                start = time.perf_counter()
+                allowed = sum(throttle_class().allow_request(request, view) for request in requests)
+                elapsed = time.perf_counter() - start
+            self.stdout.write('%-32s %12.2f %9d' % (label, elapsed / iterations * 1e6, allowed))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.shared.snapshot import registry
+
+
+class Command(BaseCommand):
+    help = 'Builds the reference data snapshot from the database and writes REFERENCE_SNAPSHOT_PATH'
+
+    def handle(self, *args, **options):
+        snapshot = registry.rebuild()
+        destination = settings.REFERENCE_SNAPSHOT_PATH or 'memory only, REFERENCE_SNAPSHOT_PATH is not set'
+        self.stdout.write(self.style.SUCCESS('Built reference data snapshot %s with %s tables (%s)' % (
+            snapshot.content_hash, len(snapshot.tables), destination)))
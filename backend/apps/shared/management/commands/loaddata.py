@@ -0,0 +1,38 @@
+from django.core.management.commands import loaddata
+from django.db import transaction
+from django.db.models.signals import pre_save
+
+from apps.shared.snapshot import bump_versions, registry
+
+
+class Command(loaddata.Command):
+    """
+    Django's loaddata, which also bumps the version of every reference table whose rows it
+    changed. Rows saved by loaddata don't bump their table one by one, and reloading a
+    fixture the database already matches bumps nothing, so clients keep their versions.
+    Only the tables of models the fixtures hold are hashed, each before its first row is
+    written.
+
+    Running servers don't get this process's signals, so once the load is committed the
+    snapshot file is rebuilt, which their workers pick up.
+    """
+
+    def loaddata(self, fixture_labels):
+        before = {}
+
+        def read_before(sender, **kwargs):
+            names = [name for name in registry.names_for_model(sender) if name not in before]
+            if names:
+                before.update(registry.read_hashes(names))
+
+        pre_save.connect(read_before, weak=False, dispatch_uid='loaddata_table_hashes')
+        try:
+            super().loaddata(fixture_labels)
+        finally:
+            pre_save.disconnect(dispatch_uid='loaddata_table_hashes')
+        after = registry.read_hashes(before)
+        changed = {name for name, digest in before.items() if after[name] != digest}
+        if changed:
+            bump_versions(changed)
+            if registry.path:
+                transaction.on_commit(registry.rebuild, using=self.using)
@@ -0,0 +1,202 @@
+import asyncio
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DatabaseError
+from django.http import JsonResponse
+from rest_framework import status
+
+from .limiter import AdaptiveLimiter
+from .snapshot import registry
+from .views import reference_route
+
+# Interval at which async requests waiting for a ConcurrencyLimitMiddleware slot check again
+ASYNC_SLOT_POLL_INTERVAL = 0.005
+
+
+class ReferenceFastLaneMiddleware:
+    """
+    Sends requests for reference routes straight to their view, skipping every middleware
+    listed after this one. The lookups are public and never read the session, user, CSRF
+    token or messages, so loading them is wasted work on the busiest routes.
+
+    Goes after CorsMiddleware, CommonMiddleware and SecurityMiddleware, whose headers the
+    responses still need, and before SessionMiddleware. Other routes go through as usual.
+
+    Under ASGI the snapshot is loaded on a worker thread when it has to be, and the view then
+    runs on the event loop, so a burst of requests is served without a thread each. A view
+    that needs the database after all (the snapshot went stale in between), or a payload
+    that isn't built yet, is rerun on a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        match = self.route(request)
+        if match is None:
+            return self.get_response(request)
+        return self.call_view(request, match)
+
+    async def __acall__(self, request):
+        match = self.route(request)
+        if match is None:
+            return await self.get_response(request)
+        if self.is_throttled(request, match):
+            # Batches and syncs build payloads, and a rerun would take a second throttle token
+            return await sync_to_async(self.call_view)(request, match)
+        try:
+            await registry.aget()
+        except DatabaseError:
+            # No snapshot to serve, the view answers with a 503 on a worker thread
+            return await sync_to_async(self.call_view)(request, match)
+        try:
+            return self.call_view(request, match)
+        except SynchronousOnlyOperation:
+            return await sync_to_async(self.call_view)(request, match)
+
+    @staticmethod
+    def route(request):
+        return reference_route(request.path_info) if request.path_info.startswith('/api/') else None
+
+    @staticmethod
+    def is_throttled(request, match):
+        view = match.func
+        actions = getattr(view, 'actions', {})
+        return actions.get(request.method.lower()) in getattr(view.cls, 'throttle_scopes', ())
+
+    @staticmethod
+    def call_view(request, match):
+        request.resolver_match = match
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        return response
+
+
+class _Held:
+    """Streaming content that calls release() once it has been sent or closed."""
+
+    def __init__(self, content, release):
+        self.content = content
+        self._release = release
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class HeldStream(_Held):
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+
+class AsyncHeldStream(_Held):
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        finally:
+            self.close()
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Limits the requests this worker handles at once with an AdaptiveLimiter, configured by
+    the CONCURRENCY_LIMIT_* settings. A request that finds the worker at its limit waits up
+    to CONCURRENCY_LIMIT_QUEUE_TIMEOUT seconds for a slot, and otherwise gets a 503 with
+    Retry-After right away, rather than piling up on the worker.
+
+    Snapshot-served reference lookups are the cheap requests: they get priority, and their
+    latency is what the limit adapts to, since it only grows when the worker is overloaded.
+    Everything else (admin, ?stream=1, batches and sync) is expensive. Streamed responses
+    hold their slot until their body has been sent. Paths starting with any of
+    CONCURRENCY_LIMIT_EXEMPT_PATHS, such as health checks, are never limited.
+
+    Goes right after CorsMiddleware, so that 503s are readable cross-origin.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiter = AdaptiveLimiter(
+            initial_limit=getattr(settings, 'CONCURRENCY_LIMIT_INITIAL', 20),
+            min_limit=getattr(settings, 'CONCURRENCY_LIMIT_MIN', 2),
+            max_limit=getattr(settings, 'CONCURRENCY_LIMIT_MAX', 200),
+            latency_target=getattr(settings, 'CONCURRENCY_LIMIT_LATENCY_TARGET', 0.25),
+        )
+        self.queue_timeout = getattr(settings, 'CONCURRENCY_LIMIT_QUEUE_TIMEOUT', 0.05)
+        self.exempt_paths = tuple(getattr(settings, 'CONCURRENCY_LIMIT_EXEMPT_PATHS', ()))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info.startswith(self.exempt_paths):
+            return self.get_response(request)
+        cheap = self.is_cheap(request)
+        if not self.limiter.acquire(cheap, self.queue_timeout):
+            return self.overloaded()
+        start = time.monotonic()
+        response = None
+        try:
+            response = self.get_response(request)
+            return self.hold_while_streaming(response)
+        finally:
+            if response is None or not response.streaming:
+                self.limiter.release(time.monotonic() - start if cheap else None)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.exempt_paths):
+            return await self.get_response(request)
+        cheap = self.is_cheap(request)
+        deadline = time.monotonic() + self.queue_timeout
+        while not self.limiter.try_acquire(cheap):
+            if time.monotonic() >= deadline:
+                self.limiter.reject()
+                return self.overloaded()
+            await asyncio.sleep(ASYNC_SLOT_POLL_INTERVAL)
+        start = time.monotonic()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return self.hold_while_streaming(response)
+        finally:
+            if response is None or not response.streaming:
+                self.limiter.release(time.monotonic() - start if cheap else None)
+
+    def hold_while_streaming(self, response):
+        """
+        A streamed body is read from the database as it is sent, so its slot is held until
+        the body has been sent, or the response is closed without sending it.
+        """
+        if response.streaming:
+            stream = AsyncHeldStream if response.is_async else HeldStream
+            response.streaming_content = stream(response.streaming_content, self.limiter.release)
+        return response
+
+    @staticmethod
+    def is_cheap(request):
+        return (request.method in ('GET', 'HEAD') and 'stream' not in request.GET
+                and ReferenceFastLaneMiddleware.route(request) is not None)
+
+    @staticmethod
+    def overloaded():
+        response = JsonResponse({'detail': 'The server is busy, try again shortly.'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '1'
+        return response
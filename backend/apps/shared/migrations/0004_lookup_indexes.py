@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shared', '0003_tableversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subregion',
+            index=models.Index(fields=['regionid'], name='subregion_region_idx'),
+        ),
+    ]
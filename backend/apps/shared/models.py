@@ -24,6 +24,7 @@ class Subregion(models.Model):
     class Meta:
         managed = True
         db_table = 'subregion'
+        indexes = [models.Index(fields=['regionid'], name='subregion_region_idx')]
 
 
 class NitrateCredit(models.Model):
@@ -35,3 +36,13 @@ class NitrateCredit(models.Model):
     class Meta:
         managed = True
         db_table = 'nitratecredit'
+
+
+class TableVersion(models.Model):
+    """Per reference table counter, bumped in the same transaction as every change to the table."""
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'table_versions'
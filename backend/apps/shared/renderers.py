@@ -0,0 +1,85 @@
+from itertools import islice
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def to_columnar(rows, columns):
+    """
+    {"columns": [...], "data": [[first column's values], [second column's values], ...]}.
+    Each key is sent once rather than once per row, and each column maps onto a typed array.
+    """
+    return {'columns': list(columns), 'data': [[row[name] for row in rows] for name in columns]}
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Selected with ?format=columnar. Lists of rows are rendered with to_columnar(), anything
+    else (single objects, errors) exactly like the JSON renderer would. An empty list has
+    no row to take the columns from, so they come from renderer_context['columns'] if set;
+    it is still {"columns": [...], "data": [...]} like a prerendered columnar payload.
+    """
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (list, tuple)) and all(isinstance(row, dict) for row in data):
+            columns = list(data[0]) if data else list((renderer_context or {}).get('columns', ()))
+            data = to_columnar(data, columns)
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+def iter_json_array(rows, chunk_size):
+    """
+    Renders an iterable of rows as a JSON array, chunk_size rows at a time. The output is
+    byte-identical to rendering the whole list at once, and the opening bracket is yielded
+    before any row is read so the response starts right away.
+    """
+    renderer = JSONRenderer()
+    rows = iter(rows)
+    yield b'['
+    separator = b''
+    while chunk := list(islice(rows, chunk_size)):
+        yield separator + renderer.render(chunk)[1:-1]
+        separator = b','
+    yield b']'
+
+
+async def aiter_json_array(rows, chunk_size):
+    """iter_json_array() for an async iterable of rows, as streamed under ASGI."""
+    renderer = JSONRenderer()
+    yield b'['
+    separator = b''
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield separator + renderer.render(chunk)[1:-1]
+            separator = b','
+            chunk = []
+    if chunk:
+        yield separator + renderer.render(chunk)[1:-1]
+    yield b']'
+
+
+def render_msgpack(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Chosen with Accept: application/msgpack. Floats are sent as 64-bit floats and every
+    other value as its native MessagePack type. Only offered when msgpack is installed.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return render_msgpack(data)
@@ -1,21 +1,111 @@
+from itertools import islice
+
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
 
 from .models import Regions, Subregion, NitrateCredit
 
+# Serializer fields whose to_representation() is a plain type conversion of the column value
+_VALUE_CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+    serializers.CharField: str,
+    serializers.BooleanField: bool,
+}
+
+
+class ValuesListModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer with an opt-in fast path for serializing whole querysets of simple
+    fields='__all__' models: rows are read with values_list() and converted with the same
+    type conversions DRF's fields apply, so the rendered JSON is byte-identical but no model
+    instances or field objects are created per row. Serializers with any other kind of field
+    fall back to the regular path.
+    """
+
+    @classmethod
+    def value_columns(cls):
+        """(field name, converter) pairs in output order, or None if the fast path can't be used."""
+        if '_value_columns' not in cls.__dict__:
+            columns = []
+            for name, serializer_field in cls().fields.items():
+                converter = _VALUE_CONVERTERS.get(type(serializer_field))
+                if converter is None or serializer_field.source != name:
+                    columns = None
+                    break
+                columns.append((name, converter))
+            cls._value_columns = columns
+        return cls._value_columns
+
+    @classmethod
+    def serialize_queryset(cls, queryset):
+        columns = cls.value_columns()
+        if columns is None:
+            return [dict(row) for row in cls(queryset, many=True).data]
+        names = [name for name, _ in columns]
+        converters = [converter for _, converter in columns]
+        return [
+            dict(zip(names, [None if value is None else convert(value) for convert, value in zip(converters, row)]))
+            for row in queryset.values_list(*names)
+        ]
+
+    @classmethod
+    def iter_queryset(cls, queryset, chunk_size, fields=None):
+        """
+        serialize_queryset() one row at a time, fetching chunk_size rows at a time through
+        a server-side cursor on databases that have them, so memory doesn't grow with the table.
+        With fields, rows have only those fields, and on the fast path only they are selected.
+        """
+        columns = cls.value_columns()
+        if columns is None:
+            for instance in queryset.iterator(chunk_size=chunk_size):
+                row = cls(instance).data
+                yield dict(row) if fields is None else {name: row[name] for name in fields}
+            return
+        if fields is not None:
+            converters = dict(columns)
+            columns = [(name, converters[name]) for name in fields]
+        names = [name for name, _ in columns]
+        converters = [converter for _, converter in columns]
+        for row in queryset.values_list(*names).iterator(chunk_size=chunk_size):
+            values = [None if value is None else convert(value) for convert, value in zip(converters, row)]
+            yield dict(zip(names, values))
+
+    @classmethod
+    async def aiter_queryset(cls, queryset, chunk_size, fields=None):
+        """
+        iter_queryset() for async code, through the async ORM's aiterator(). The fallback
+        path serializes model instances, so it fetches each chunk on a worker thread instead.
+        """
+        columns = cls.value_columns()
+        if columns is None:
+            rows = cls.iter_queryset(queryset, chunk_size, fields)
+            while chunk := await sync_to_async(list)(islice(rows, chunk_size)):
+                for row in chunk:
+                    yield row
+            return
+        if fields is not None:
+            converters = dict(columns)
+            columns = [(name, converters[name]) for name in fields]
+        names = [name for name, _ in columns]
+        # values(), as values_list()'s aiterator() runs its query before iterating, on the event loop
+        async for row in queryset.values(*names).aiterator(chunk_size=chunk_size):
+            yield {name: None if row[name] is None else convert(row[name]) for name, convert in columns}
+
 
-class RegionsSerializer(serializers.ModelSerializer):
+class RegionsSerializer(ValuesListModelSerializer):
     class Meta:
         model = Regions
         fields = '__all__'
 
 
-class SubregionSerializer(serializers.ModelSerializer):
+class SubregionSerializer(ValuesListModelSerializer):
     class Meta:
         model = Subregion
         fields = '__all__'
 
 
-class NitrateCreditSerializer(serializers.ModelSerializer):
+class NitrateCreditSerializer(ValuesListModelSerializer):
     class Meta:
         model = NitrateCredit
         fields = '__all__'
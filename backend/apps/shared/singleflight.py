@@ -0,0 +1,77 @@
+import threading
+
+
+class CoalescedTimeout(TimeoutError):
+    """Raised to a caller that gave up waiting on another caller's computation."""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time. A caller asking for a key that is
+    already being computed waits for that computation and gets its result, or its
+    exception, instead of running its own.
+
+    The counters say how many computations ran (leaders), how many callers were handed
+    another's result instead (coalesced), and how many gave up waiting (timeouts).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, func, timeout=None):
+        """
+        func() for the first caller of a key, whose result every caller that comes in
+        before it returns shares. Followers wait at most timeout seconds, after which
+        they get CoalescedTimeout.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                flight.result = func()
+            except BaseException as error:
+                flight.error = error
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result
+        if not flight.done.wait(timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise CoalescedTimeout('Gave up waiting on %s %r after %ss' % (self.name, key, timeout))
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'timeouts': self.timeouts,
+                'in_flight': len(self._flights),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.leaders = self.coalesced = self.timeouts = 0
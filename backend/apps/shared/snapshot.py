@@ -0,0 +1,956 @@
+"""
+In-memory snapshot of the reference tables served under /api/.
+
+The reference tables only change when fixtures are loaded or a row is edited in the
+admin, so each table is read and serialized once and the rendered JSON is shared by
+every request until a save or delete marks the table stale.
+
+Every change also bumps the table's TableVersion, which lets clients that already hold
+some version of a table sync only what changed since (see SnapshotRegistry.sync).
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from .breaker import CircuitBreaker
+from .models import TableVersion
+from .renderers import msgpack, render_msgpack, to_columnar
+from .singleflight import CoalescedTimeout, SingleFlight
+from .tables import (
+    BOOTSTRAP_TABLES, REFERENCE_TABLES, REGION_BOOTSTRAP_TABLES, REGION_SCOPED_TABLES, TABLE_RELATIONS,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Earlier versions of each table kept per process, for computing row changes since them
+SYNC_HISTORY_LENGTH = 8
+
+# Distinct ?fields= projections and pages memoized per table, and columnar renderings per
+# payload, beyond which they are built per request
+MAX_PROJECTIONS = 256
+
+# Bodies smaller than this gain too little from compression to be worth a Vary header
+MIN_COMPRESS_SIZE = 512
+
+_renderer = JSONRenderer()
+
+# Memoized payloads being built. Concurrent requests missing the same memo wait for the one
+# build, up to settings.REFERENCE_COALESCE_TIMEOUT seconds, then build their own.
+payload_flights = SingleFlight('reference payloads')
+
+
+def render_json(data):
+    return _renderer.render(data)
+
+
+def coalesce_timeout():
+    return getattr(settings, 'REFERENCE_COALESCE_TIMEOUT', 10)
+
+
+def build_off_event_loop():
+    """
+    Raises SynchronousOnlyOperation on an event loop thread. Compressing a payload takes
+    long enough to stall every other request on the loop, so ASGI views that would build
+    one are rerun on a worker thread instead (see ReferenceFastLaneMiddleware).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise SynchronousOnlyOperation('Reference payloads are built on a worker thread, not the event loop.')
+
+
+def memoized(memo, key, build, limit=None, compress=None):
+    """
+    memo[key], or build() stored there. Results are only stored while the memo has fewer
+    than limit entries, and EMPTY ones never are. compress() is applied to results that
+    are stored, so that ones which won't be aren't compressed for nothing. Misses can't be
+    built on an event loop.
+    """
+    value = memo.get(key)
+    if value is not None:
+        return value
+    build_off_event_loop()
+
+    def build_and_store():
+        value = build()
+        if value is EMPTY or (limit is not None and len(memo) >= limit):
+            return value
+        return memo.setdefault(key, value if compress is None else compress(value))
+
+    try:
+        return payload_flights.do((id(memo), key), build_and_store, timeout=coalesce_timeout())
+    except CoalescedTimeout:
+        return build_and_store()
+
+
+_UNPARSED = object()
+
+
+class Payload:
+    """
+    Serialized data together with its JSON rendering and any precompressed variants of it.
+    Payloads mapped from a snapshot file only parse their JSON if the data is needed.
+    """
+
+    def __init__(self, data, content, encodings=None, digest=None):
+        self.content = content
+        self.encodings = encodings or {}
+        self._columnar = {}
+        if data is not _UNPARSED:
+            self.__dict__['data'] = data
+        if digest is not None:
+            self.__dict__['digest'] = digest
+
+    @classmethod
+    def build(cls, data):
+        return cls(data, render_json(data))
+
+    @classmethod
+    def rendered(cls, content):
+        """Payload of already rendered JSON, which is only parsed if its data is needed."""
+        return cls(_UNPARSED, content)
+
+    @cached_property
+    def data(self):
+        return json.loads(bytes(self.content))
+
+    @cached_property
+    def digest(self):
+        return hashlib.sha256(self.content).hexdigest()
+
+    def etag(self, encoding=None):
+        """Strong validator for the identity or the given content-coded representation."""
+        return '"%s"' % self.digest if encoding is None else '"%s-%s"' % (self.digest, encoding)
+
+    def compressed(self):
+        """
+        Copy with Brotli and gzip variants at their smallest-output settings. This is slow
+        compared to on-the-fly compression, which is fine because it happens once per build.
+        """
+        if len(self.content) < MIN_COMPRESS_SIZE:
+            return self
+        encodings = {}
+        if brotli is not None:
+            encodings['br'] = brotli.compress(self.content, mode=brotli.MODE_TEXT, quality=11)
+        # mtime=0 keeps the output identical for identical content
+        encodings['gzip'] = gzip.compress(self.content, compresslevel=9, mtime=0)
+        return Payload(self.__dict__.get('data', _UNPARSED), self.content, encodings)
+
+    def prebuilt(self):
+        """
+        Copy compressed like compressed(), with its MessagePack encoding built too rather than
+        on first use. For the payloads built once per snapshot and written to the snapshot file.
+        """
+        payload = self.compressed()
+        if msgpack is not None:
+            payload.__dict__['msgpack'] = payload._build_msgpack()
+        return payload
+
+    @cached_property
+    def msgpack(self):
+        """The same data encoded as MessagePack, for the MessagePack renderer."""
+        build_off_event_loop()
+        return self._build_msgpack()
+
+    def _build_msgpack(self):
+        return Payload(self.data, render_msgpack(self.data)).compressed()
+
+    def columnar(self, columns):
+        """The rows in the ?format=columnar shape, see to_columnar(). An object is one row."""
+        columns = tuple(columns)
+
+        def build():
+            rows = [self.data] if isinstance(self.data, dict) else self.data
+            return Payload.build(to_columnar(rows, columns))
+
+        return memoized(self._columnar, columns, build, limit=MAX_PROJECTIONS, compress=Payload.compressed)
+
+
+EMPTY = Payload.build(())
+
+
+@dataclass(frozen=True)
+class TableSnapshot:
+    name: str
+    model: type
+    all: Payload
+    version: int = 0
+    columns: tuple = ()
+    _filtered: dict = field(default_factory=dict, repr=False, compare=False)
+    _objects: dict = field(default_factory=dict, repr=False, compare=False)
+    _changes: dict = field(default_factory=dict, repr=False, compare=False)
+    _projected: dict = field(default_factory=dict, repr=False, compare=False)
+    _pages: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def rows(self):
+        return self.all.data
+
+    @property
+    def content_hash(self):
+        """Short hash of the table's content, used in /api/v/<hash>/ URLs."""
+        return self.all.digest[:16]
+
+    def filter(self, **filters):
+        """
+        Rows whose fields equal every given value. Non-empty results are memoized, which
+        stays bounded because there are only so many distinct non-empty subsets of a table.
+        """
+        key = tuple(sorted(filters.items()))
+
+        def build():
+            rows = tuple(row for row in self.rows if all(row[name] == value for name, value in key))
+            return Payload.build(rows).compressed() if rows else EMPTY
+
+        return memoized(self._filtered, key, build)
+
+    def get(self, pk, fields=None):
+        if fields is not None:
+            return self.project(fields, many=False, id=pk)
+
+        def build():
+            rows = self.filter(id=pk).data
+            if not rows:
+                raise Http404('No %s matches the given query.' % self.model._meta.object_name)
+            return Payload.build(rows[0]).compressed()
+
+        return memoized(self._objects, pk, build)
+
+    def project(self, fields, many=True, **filters):
+        """
+        Only the given fields of the rows filter() returns, or of the one row get() returns
+        when many is False. Memoized per projection, up to MAX_PROJECTIONS of them.
+        """
+        key = (tuple(fields), many, tuple(sorted(filters.items())))
+
+        def build():
+            rows = self.filter(**filters).data if filters else self.rows
+            if not rows:
+                if not many:
+                    raise Http404('No %s matches the given query.' % self.model._meta.object_name)
+                return EMPTY
+            projected = tuple({name: row[name] for name in fields} for row in rows)
+            return Payload.build(projected if many else projected[0])
+
+        return memoized(self._projected, key, build, limit=MAX_PROJECTIONS, compress=Payload.compressed)
+
+    @cached_property
+    def rows_by_id(self):
+        return {row['id']: row for row in self.rows}
+
+    def lookup(self, ids, fields=None, **filters):
+        """
+        The rows with the given ids, in that order and among those filter() returns, with only
+        the given fields if any, and the ids that matched no row. Not memoized, since there is
+        no bound on the combinations of ids asked for.
+        """
+        if filters:
+            index = {row['id']: row for row in self.filter(**filters).data}
+        else:
+            index = self.rows_by_id
+        rows = [index[pk] for pk in ids if pk in index]
+        missing = [pk for pk in ids if pk not in index]
+        if fields is not None:
+            rows = [{name: row[name] for name in fields} for row in rows]
+        return Payload.build(rows), missing
+
+    def page(self, after, limit, fields=None, **filters):
+        """
+        Up to limit of the rows filter() returns whose id is greater than after (None for the
+        first page), with only the given fields if any, and the id the next page starts after,
+        which is None on the last page. Rows are in id order, so the page is found by bisection.
+        Memoized like projections, by the id of the row the page starts after rather than the
+        after asked for, so that every value between two ids is the same page.
+        """
+        rows = self.filter(**filters).data if filters else self.rows
+        start = 0 if after is None else bisect_right(rows, after, key=lambda row: row['id'])
+        key = (rows[start - 1]['id'] if start else None, limit, fields, tuple(sorted(filters.items())))
+
+        def build():
+            page = rows[start:start + limit]
+            next_after = page[-1]['id'] if start + limit < len(rows) else None
+            if fields is not None:
+                page = [{name: row[name] for name in fields} for row in page]
+            return Payload.build(page), next_after
+
+        def compress(result):
+            payload, next_after = result
+            return payload.compressed(), next_after
+
+        return memoized(self._pages, key, build, limit=MAX_PROJECTIONS, compress=compress)
+
+    def changes_since(self, previous):
+        """
+        {"upserts": [rows added or changed], "deletes": [ids removed]} since an earlier
+        snapshot of this table, matching rows up by id.
+        """
+
+        def build():
+            old_rows = {row['id']: row for row in previous.rows}
+            new_ids = set()
+            upserts = []
+            for row in self.rows:
+                new_ids.add(row['id'])
+                if old_rows.get(row['id']) != row:
+                    upserts.append(row)
+            deletes = [pk for pk in old_rows if pk not in new_ids]
+            return Payload.build({'upserts': upserts, 'deletes': deletes})
+
+        return memoized(self._changes, previous.version, build)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    tables: dict
+    built_at: float
+    _bundles: dict = field(default_factory=dict, repr=False, compare=False)
+    _expanded: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def versions(self):
+        return {name: table.version for name, table in self.tables.items()}
+
+    @cached_property
+    def content_hash(self):
+        """Short hash over every table's hash, naming this exact set of reference data."""
+        digest = hashlib.sha256()
+        for name in sorted(self.tables):
+            digest.update(('%s:%s;' % (name, self.tables[name].content_hash)).encode())
+        return digest.hexdigest()[:16]
+
+    @cached_property
+    def manifest(self):
+        build_off_event_loop()
+        return Payload.build({
+            'version': self.content_hash,
+            'tables': {name: table.content_hash for name, table in self.tables.items()},
+            'relations': {
+                name: {
+                    relation: {'column': column, 'table': target} for relation, (column, target) in relations.items()
+                }
+                for name, relations in TABLE_RELATIONS.items() if name in self.tables
+            },
+        }).compressed()
+
+    def expanded_hash(self, name, relations):
+        """
+        Hash in /api/v/<hash>/ URLs of the named table expanded with the given relations: the
+        table's own, or with relations one over it and every related table's hash, since the
+        nested rows change with those tables too.
+        """
+        if not relations:
+            return self.tables[name].content_hash
+        digest = hashlib.sha256(self.tables[name].content_hash.encode())
+        for relation in relations:
+            digest.update((';%s' % self.tables[TABLE_RELATIONS[name][relation][1]].content_hash).encode())
+        return digest.hexdigest()[:16]
+
+    def expanded(self, name, relations):
+        """
+        The named table with the row each of the given TABLE_RELATIONS points at nested under
+        the relation's name, or null where there is no such row. Memoized per combination.
+        """
+        if not relations:
+            return self.tables[name]
+
+        def build():
+            base = self.tables[name]
+            joins = []
+            for relation in relations:
+                column, target = TABLE_RELATIONS[name][relation]
+                joins.append((relation, column, self.tables[target].rows_by_id))
+            rows = tuple(
+                {**row, **{relation: index.get(row[column]) for relation, column, index in joins}} for row in base.rows
+            )
+            return TableSnapshot(name=name, model=base.model, all=Payload.build(rows).prebuilt(),
+                                 version=base.version, columns=base.columns + tuple(relations))
+
+        return memoized(self._expanded, (name, tuple(relations)), build)
+
+    def bundle(self, names=BOOTSTRAP_TABLES, columnar=False):
+        """
+        One JSON object keyed by endpoint name, stitched together from the tables' rendered
+        JSON, or their columnar rendering. Only the default bundles are compressed and kept,
+        other selections are cheap to join but are sent uncompressed.
+        """
+        names = tuple(names)
+
+        def build():
+            tables = [self.tables[name] for name in names]
+            payloads = [table.all.columnar(table.columns) if columnar else table.all for table in tables]
+            content = b'{' + b','.join(
+                render_json(table.name) + b':' + payload.content for table, payload in zip(tables, payloads)) + b'}'
+            return Payload.rendered(content)
+
+        if names != BOOTSTRAP_TABLES:
+            return build()
+        if columnar:
+            return memoized(self._bundles, (names, columnar), lambda: build().compressed())
+        return memoized(self._bundles, names, lambda: build().prebuilt())
+
+    def region_bundle(self, region_id, columnar=False):
+        """
+        The REGION_BOOTSTRAP_TABLES like bundle(), with the REGION_SCOPED_TABLES narrowed to the
+        given region's rows. Compressed and kept per region, of which there are only a few.
+        """
+
+        def build():
+            region = self.tables['regions'].rows_by_id.get(region_id)
+            if region is None:
+                raise Http404('No Regions matches the given query.')
+            parts = []
+            for name in REGION_BOOTSTRAP_TABLES:
+                table = self.tables[name]
+                table_payload = table.all
+                if name in REGION_SCOPED_TABLES:
+                    row_field, region_field = REGION_SCOPED_TABLES[name]
+                    table_payload = table.filter(**{row_field: region[region_field]})
+                if columnar:
+                    table_payload = table_payload.columnar(table.columns)
+                parts.append(render_json(name) + b':' + table_payload.content)
+            return Payload.rendered(b'{' + b','.join(parts) + b'}').compressed()
+
+        return memoized(self._bundles, ('region', region_id, columnar), build)
+
+
+# Layout: magic, 8-byte little-endian header length, JSON header, then the payload bytes.
+# Header offsets are relative to the end of the header.
+SNAPSHOT_FILE_MAGIC = b'NMPSNAP3'
+
+
+def write_snapshot_file(snapshot, path):
+    """
+    Writes every table's rendered, compressed and MessagePack payloads, and the bootstrap
+    bundle, to path so other workers can map them instead of holding their own copies. Only
+    these full-table bodies are written; see read_snapshot_file(). The file is replaced
+    atomically.
+    """
+    blobs = []
+    offset = 0
+
+    def add(payload):
+        nonlocal offset
+        entry = {'digest': payload.digest, 'encodings': {}}
+        for encoding, content in (('identity', payload.content), *payload.encodings.items()):
+            blobs.append(content)
+            span = [offset, len(content)]
+            offset += len(content)
+            if encoding == 'identity':
+                entry['content'] = span
+            else:
+                entry['encodings'][encoding] = span
+        if 'msgpack' in payload.__dict__:
+            entry['msgpack'] = add(payload.msgpack)
+        return entry
+
+    has_bundle = set(BOOTSTRAP_TABLES) <= snapshot.tables.keys()
+    header = {
+        'version': snapshot.version,
+        'built_at': snapshot.built_at,
+        'tables': {
+            name: {
+                'model': table.model._meta.label_lower,
+                'version': table.version,
+                'columns': table.columns,
+                'payload': add(table.all),
+            }
+            for name, table in snapshot.tables.items()
+        },
+        'bundle': add(snapshot.bundle()) if has_bundle else None,
+        'bundle_tables': BOOTSTRAP_TABLES,
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as snapshot_file:
+        snapshot_file.write(SNAPSHOT_FILE_MAGIC)
+        snapshot_file.write(len(header_bytes).to_bytes(8, 'little'))
+        snapshot_file.write(header_bytes)
+        for blob in blobs:
+            snapshot_file.write(blob)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_file(path, names):
+    """
+    Maps a file written by write_snapshot_file read-only. Payload contents are slices of the
+    mapping, so the pages are shared by every process mapping the same file. Returns None
+    if the file doesn't hold exactly the given tables.
+
+    That sharing only covers the full-table bodies and the bootstrap bundle. Filtered,
+    ?fields, ?ids, ?expand, columnar and detail responses parse the table's rows
+    into the worker's own memory and memoize what they build there, as without a file.
+    Nor is serving a mapped body zero-copy: HttpResponse copies it into bytes per response.
+    """
+    with open(path, 'rb') as snapshot_file:
+        mapping = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+    if bytes(view[:8]) != SNAPSHOT_FILE_MAGIC:
+        return None
+    header_length = int.from_bytes(view[8:16], 'little')
+    header = json.loads(bytes(view[16:16 + header_length]))
+    base = 16 + header_length
+    if set(header['tables']) != set(names):
+        return None
+
+    def payload(entry):
+        def span(start, length):
+            return view[base + start:base + start + length]
+        encodings = {encoding: span(*location) for encoding, location in entry['encodings'].items()}
+        mapped = Payload(_UNPARSED, span(*entry['content']), encodings, digest=entry['digest'])
+        if 'msgpack' in entry:
+            mapped.__dict__['msgpack'] = payload(entry['msgpack'])
+        return mapped
+
+    snapshot = Snapshot(
+        version=header['version'],
+        tables={
+            name: TableSnapshot(name=name, model=apps.get_model(entry['model']), all=payload(entry['payload']),
+                                version=entry['version'], columns=tuple(entry['columns']))
+            for name, entry in header['tables'].items()
+        },
+        built_at=header['built_at'],
+    )
+    if header['bundle'] is not None and tuple(header['bundle_tables']) == BOOTSTRAP_TABLES:
+        snapshot._bundles[BOOTSTRAP_TABLES] = payload(header['bundle'])
+    return snapshot
+
+
+@contextmanager
+def consistent_read():
+    """
+    Transaction in which every query sees the same committed data, so the versions read
+    in it describe exactly the rows read with them. SQLite transactions already do;
+    PostgreSQL's default READ COMMITTED takes a new snapshot per statement. On PostgreSQL
+    its queries are also cancelled after REFERENCE_DB_STATEMENT_TIMEOUT seconds.
+    """
+    connection = transaction.get_connection()
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            timeout = getattr(settings, 'REFERENCE_DB_STATEMENT_TIMEOUT', 30)
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+                cursor.execute('SET LOCAL statement_timeout = %d' % (timeout * 1000))
+        yield
+
+
+class SnapshotRegistry:
+    """
+    Holds the current Snapshot. Snapshots are never mutated: a rebuild swaps in a new
+    Snapshot with a higher version that reuses every table that did not change.
+
+    When settings.REFERENCE_SNAPSHOT_PATH is set, every build is also written to that file
+    and a worker without a snapshot maps the file instead of querying the database. Workers
+    pick up a file rewritten by another worker within REFERENCE_SNAPSHOT_CHECK_INTERVAL.
+
+    The last SYNC_HISTORY_LENGTH versions of each table this process has held are kept,
+    so that sync() can send a client only the rows changed since one of them.
+
+    Builds go through a circuit breaker. When one fails, or the breaker is open after
+    repeated failed or slow builds, the snapshot this process already holds (or else the
+    snapshot file) keeps being served, and stale_for() says for how long.
+    """
+
+    def __init__(self, tables):
+        self._serializer_paths = tables
+        self._serializers = None
+        self._model_names = None
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stale = set()
+        self._file_stat = None
+        self._file_checked_at = 0
+        self._history = {}
+        self._stale_since = None
+        self._progress = (0, 0)
+        self._warming = False
+        self._loads = SingleFlight('reference snapshot')
+        self.breaker = CircuitBreaker(
+            'reference database',
+            failure_threshold=getattr(settings, 'REFERENCE_DB_FAILURE_THRESHOLD', 3),
+            reset_timeout=getattr(settings, 'REFERENCE_DB_RESET_TIMEOUT', 30),
+            slow_call=getattr(settings, 'REFERENCE_DB_SLOW_CALL', 5),
+        )
+
+    @property
+    def serializers(self):
+        if self._serializers is None:
+            self._serializers = {name: import_string(path) for name, path in self._serializer_paths.items()}
+        return self._serializers
+
+    @property
+    def path(self):
+        return getattr(settings, 'REFERENCE_SNAPSHOT_PATH', None)
+
+    def names_for_model(self, model):
+        if self._model_names is None:
+            model_names = {}
+            for name, serializer in self.serializers.items():
+                model_names.setdefault(serializer.Meta.model, []).append(name)
+            self._model_names = model_names
+        return self._model_names.get(model, [])
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or self._file_changed():
+            snapshot = self.load()
+        return snapshot
+
+    async def aget(self):
+        """get() for async code. A snapshot that has to be read or built is, on a worker thread."""
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or self._file_changed():
+            snapshot = await sync_to_async(self.load)()
+        return snapshot
+
+    def table(self, name):
+        return self.get().tables[name]
+
+    def load(self):
+        """
+        Brings the snapshot up to date. Concurrent callers share a single load, waiting at
+        most REFERENCE_COALESCE_TIMEOUT seconds for it. While a snapshot is held, callers
+        don't wait: they get that snapshot while it is refreshed on a background thread.
+        Callers in a transaction refresh it themselves, as other connections can't see
+        what they wrote yet.
+        """
+        current = self._snapshot
+        if current is not None and not transaction.get_connection().in_atomic_block:
+            self.warm_in_background()
+            return current
+        try:
+            return self._loads.do('snapshot', self._load, timeout=coalesce_timeout())
+        except CoalescedTimeout:
+            if current is None:
+                raise
+            return current
+
+    def _load(self, serve_stale=True):
+        with self._lock:
+            current = self._snapshot
+            if not self._stale:
+                if current is not None and not self._file_changed(force=True):
+                    # Another thread reloaded it while we were waiting on the lock
+                    return current
+                mapped = self._read_file()
+                if mapped is not None:
+                    self._swap(mapped)
+                    return mapped
+                if current is not None:
+                    return current
+            stale, self._stale = self._stale, set()
+            names = self.serializers.keys() if current is None else stale
+            self._progress = (0, len(names))
+            try:
+                tables = dict(current.tables) if current is not None else {}
+                # Only the reads are timed by the breaker and held in the transaction, not compression
+                with self.breaker.call(), consistent_read():
+                    versions = dict(TableVersion.objects.filter(name__in=list(names)).values_list('name', 'version'))
+                    rows = {name: self._read_table(name) for name in names}
+                for built, name in enumerate(names, 1):
+                    tables[name] = self._table_snapshot(name, rows[name], versions.get(name, 0))
+                    self._progress = (built, len(names))
+            except DatabaseError as error:
+                self._stale |= stale
+                if not serve_stale:
+                    raise
+                fallback = current if current is not None else self._read_file()
+                if fallback is None:
+                    raise
+                if current is None:
+                    # The file may be behind the database, so every table is retried once it is back
+                    self._swap(fallback)
+                    self._stale = set(self.serializers)
+                if self._stale_since is None:
+                    self._stale_since = time.time()
+                    logger.warning('Serving the last good reference data snapshot: %s', error)
+                return fallback
+            except Exception:
+                self._stale |= stale
+                raise
+            snapshot = Snapshot(
+                version=current.version + 1 if current is not None else 1,
+                tables=tables,
+                built_at=time.time(),
+            )
+            if set(BOOTSTRAP_TABLES) <= tables.keys():
+                snapshot.bundle()
+            self._stale_since = None
+            self._swap(snapshot)
+            self._write_file(snapshot)
+            return snapshot
+
+    def rebuild(self):
+        """Rebuilds every table from the database, ignoring any snapshot file."""
+        with self._lock:
+            self._snapshot = None
+            self._stale = set(self.serializers)
+        return self._load(serve_stale=False)
+
+    def stale_for(self):
+        """
+        Seconds since a build failed while the snapshot being served needed one, or None
+        if the snapshot is up to date as far as this process knows.
+        """
+        stale_since = self._stale_since
+        return None if stale_since is None else time.time() - stale_since
+
+    def sync(self, versions, names=BOOTSTRAP_TABLES):
+        """
+        What a client holding the given {table: version} needs to bring the named tables up
+        to date, as a JSON object of:
+
+          "versions": the client's new version of every named table
+          "tables":   full rows of the tables it doesn't hold, or whose changes are unknown
+          "changes":  {"upserts": [...], "deletes": [ids]} of the tables changed since a
+                      version this process still remembers, when smaller than the table
+
+        Tables the client already holds at the current or a later version are left out.
+        """
+        snapshot = self.get()
+        new_versions = {}
+        tables = []
+        changes = []
+        for name in names:
+            table = snapshot.tables[name]
+            held = versions.get(name)
+            if held is not None and held >= table.version:
+                # Later versions come from a worker that has seen a change this one hasn't yet
+                new_versions[name] = held
+                continue
+            new_versions[name] = table.version
+            delta = self._changes(table, held)
+            if delta is not None and len(delta.content) < len(table.all.content):
+                changes.append(render_json(name) + b':' + delta.content)
+            else:
+                tables.append(render_json(name) + b':' + table.all.content)
+        content = b'{"versions":%s,"tables":{%s},"changes":{%s}}' % (
+            render_json(new_versions), b','.join(tables), b','.join(changes))
+        return Payload.rendered(content)
+
+    def _changes(self, table, version):
+        for previous in tuple(self._history.get(table.name, ())):
+            if previous.version == version:
+                return table.changes_since(previous)
+        return None
+
+    def _swap(self, snapshot):
+        """Makes snapshot current, remembering the tables whose version it replaces."""
+        current = self._snapshot
+        if current is not None:
+            for name, table in current.tables.items():
+                replacement = snapshot.tables.get(name)
+                if replacement is not None and replacement.version != table.version:
+                    self._history.setdefault(name, deque(maxlen=SYNC_HISTORY_LENGTH)).appendleft(table)
+        self._snapshot = snapshot
+
+    def _read_table(self, name):
+        serializer_class = self.serializers[name]
+        # Ordered so that the rendered bytes only change when the data does
+        queryset = serializer_class.Meta.model.objects.order_by('pk')
+        if hasattr(serializer_class, 'serialize_queryset'):
+            return tuple(serializer_class.serialize_queryset(queryset))
+        return tuple(dict(row) for row in serializer_class(queryset, many=True).data)
+
+    def read_hashes(self, names):
+        """Hash of each named table's rows as the database holds them now, like Payload.digest."""
+        return {name: hashlib.sha256(render_json(self._read_table(name))).hexdigest() for name in names}
+
+    def _table_snapshot(self, name, rows, version=0):
+        serializer_class = self.serializers[name]
+        return TableSnapshot(name=name, model=serializer_class.Meta.model, all=Payload.build(rows).prebuilt(),
+                             version=version, columns=tuple(serializer_class().fields))
+
+    def _stat_file(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _file_changed(self, force=False):
+        if not self.path or self._snapshot is None:
+            return False
+        now = time.monotonic()
+        if not force and now - self._file_checked_at < getattr(settings, 'REFERENCE_SNAPSHOT_CHECK_INTERVAL', 5):
+            return False
+        self._file_checked_at = now
+        stat = self._stat_file()
+        return stat is not None and stat != self._file_stat
+
+    def _read_file(self):
+        if not self.path:
+            return None
+        stat = self._stat_file()
+        if stat is None:
+            return None
+        try:
+            snapshot = read_snapshot_file(self.path, self.serializers)
+            if snapshot is None:
+                logger.warning('Ignoring reference data snapshot file %s, it does not match the registered tables',
+                               self.path)
+        except (OSError, ValueError, KeyError, LookupError):
+            logger.exception('Could not map the reference data snapshot file %s', self.path)
+            snapshot = None
+        self._file_stat = stat
+        return snapshot
+
+    def _write_file(self, snapshot):
+        if not self.path:
+            return
+        try:
+            write_snapshot_file(snapshot, self.path)
+        except OSError:
+            logger.exception('Could not write the reference data snapshot file %s', self.path)
+            return
+        self._file_stat = self._stat_file()
+
+    def invalidate(self, model=None):
+        """Marks the tables backed by model (or every table) to be rebuilt on next access."""
+        names = self.serializers.keys() if model is None else self.names_for_model(model)
+        self._stale.update(names)
+
+    def reset(self):
+        with self._lock:
+            self._snapshot = None
+            self._stale = set()
+            self._file_stat = None
+            self._history = {}
+            self._stale_since = None
+            self._progress = (0, 0)
+        self.breaker.reset()
+        self._loads.reset()
+        payload_flights.reset()
+
+    def flight_stats(self):
+        """SingleFlight counters of snapshot loads and memoized payload builds."""
+        return {'snapshot': self._loads.stats(), 'payloads': payload_flights.stats()}
+
+    def warm(self):
+        """
+        Loads the snapshot, or brings it up to date, ahead of requests; failures are retried
+        lazily. Waits at most REFERENCE_COALESCE_TIMEOUT seconds on a load already running.
+        """
+        current = self._snapshot
+        try:
+            snapshot = self._loads.do('snapshot', self._load, timeout=coalesce_timeout())
+        except DatabaseError:
+            logger.exception('Could not load the reference data snapshot, will retry on a later request')
+            return None
+        except CoalescedTimeout:
+            logger.warning('Gave up waiting on a reference data snapshot load, it keeps running')
+            return current
+        if snapshot is not current:
+            logger.info('Loaded reference data snapshot v%s with %s tables', snapshot.version, len(snapshot.tables))
+        return snapshot
+
+    def warm_in_background(self):
+        """
+        warm() on a thread of its own, unless one is already warming, a load is already
+        running or it would only be turned away by the open circuit breaker. Never waits on
+        the lock: a load holds it for as long as it runs.
+        """
+        if not self._lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+            return
+        try:
+            if self._warming or self._loads.stats()['in_flight'] or (self._stale and self.breaker.state == 'open'):
+                return
+            self._warming = True
+            try:
+                threading.Thread(target=self._warm_thread, name='reference-snapshot-warm', daemon=True).start()
+            except BaseException:
+                self._warming = False
+                raise
+        finally:
+            self._lock.release()
+
+    def _warm_thread(self):
+        try:
+            self.warm()
+        finally:
+            self._warming = False
+            connections.close_all()
+
+    def status(self):
+        """
+        What this process holds, for the readiness check, without loading anything:
+        whether a snapshot is loaded and its content hash, whether the bootstrap bundle
+        is built (so /api/bootstrap/ is answered from memory), how far the current or
+        last build got, and how stale the snapshot is.
+        """
+        snapshot = self._snapshot
+        built, total = self._progress
+        return {
+            'loaded': snapshot is not None,
+            'version': snapshot.version if snapshot is not None else None,
+            'content_hash': snapshot.content_hash if snapshot is not None else None,
+            'bootstrap_ready': snapshot is not None and BOOTSTRAP_TABLES in snapshot._bundles,
+            'tables_built': built,
+            'tables_to_build': total,
+            'loading': bool(self._loads.stats()['in_flight']),
+            'stale_tables': sorted(self._stale),
+            'stale_for': self.stale_for(),
+            'breaker': self.breaker.state,
+        }
+
+
+registry = SnapshotRegistry(REFERENCE_TABLES)
+
+
+def bump_versions(names):
+    """
+    Increments the version of each named table, starting untracked tables at 1. Saves and
+    deletes call it through their signals, but QuerySet.update(), bulk_create() and raw SQL
+    send none: code writing reference tables that way must call it with the tables it
+    changed, and registry.invalidate() once committed.
+    """
+    names = sorted(names)
+    TableVersion.objects.bulk_create([TableVersion(name=name) for name in names], ignore_conflicts=True)
+    TableVersion.objects.filter(name__in=names).update(version=F('version') + 1)
+
+
+def _on_table_changed(sender, raw=False, **kwargs):
+    # Fires for admin saves and, with raw=True, for every row written by loaddata
+    names = registry.names_for_model(sender)
+    if not names:
+        return
+    # Once committed, or a concurrent load could read the rows from before and clear the mark
+    transaction.on_commit(lambda: registry.invalidate(sender))
+    if not raw:
+        # loaddata bumps each table once when it is done, see the shared loaddata command
+        bump_versions(names)
+
+
+def connect_signals():
+    post_save.connect(_on_table_changed, dispatch_uid='reference_snapshot_post_save')
+    post_delete.connect(_on_table_changed, dispatch_uid='reference_snapshot_post_delete')
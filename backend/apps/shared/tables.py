@@ -0,0 +1,109 @@
+"""
+The reference tables served under /api/, and how they are grouped and related.
+"""
+
+# Endpoint name (as routed under /api/) -> serializer used to build the table
+REFERENCE_TABLES = {
+    'animals': 'apps.animals.serializers.AnimalsSerializer',
+    'animal_subtypes': 'apps.animals.serializers.AnimalSubtypeSerializer',
+    'breeds': 'apps.animals.serializers.BreedSerializer',
+    'croptypes': 'apps.crops.serializers.CropTypesSerializer',
+    'crops': 'apps.crops.serializers.CropsSerializer',
+    'previouscroptypes': 'apps.crops.serializers.PreviousCropTypesSerializer',
+    'cropsoiltestphosphorousregions': 'apps.crops.serializers.CropSoilTestPhosphorousRegionsSerializer',
+    'soiltestphosphorousrecommendation': 'apps.crops.serializers.SoilTestPhosphorousRecommendationSerializer',
+    'soiltestphosphorouskelonwaranges': 'apps.crops.serializers.SoilTestPhosphorousKelownaRangesSerializer',
+    'soiltestmethods': 'apps.crops.serializers.SoilTestMethodsSerializer',
+    'cropsconversionfactors': 'apps.crops.serializers.ConversionFactorsSerializer',
+    'soiltestpotassiumkelownaranges': 'apps.crops.serializers.SoilTestPotassiumKelownaRangesSerializer',
+    'soiltestpotassiumrecommendation': 'apps.crops.serializers.SoilTestPotassiumRecommendationSerializer',
+    'cropsoilpotassiumregions': 'apps.crops.serializers.CropSoilPotassiumRegionsSerializer',
+    'cropyields': 'apps.crops.serializers.CropYieldsSerializer',
+    'nitrogenrecommendation': 'apps.crops.serializers.NitrogenRecommendationSerializer',
+    'plantage': 'apps.crops.serializers.PlantAgeSerializer',
+    'wherewillpruningsgo': 'apps.crops.serializers.WhereWillPruningsGoSerializer',
+    'soiltestpotassiumranges': 'apps.crops.serializers.SoilTestPotassiumRangesSerializer',
+    'soiltestphosphorousranges': 'apps.crops.serializers.SoilTestPhosphorousRangesSerializer',
+    'berryQuantities': 'apps.crops.serializers.BerryQuantitiesSerializer',
+    'regions': 'apps.shared.serializers.RegionsSerializer',
+    'subregions': 'apps.shared.serializers.SubregionSerializer',
+    'nitratecredit': 'apps.shared.serializers.NitrateCreditSerializer',
+    'manures': 'apps.manures.serializers.ManuresSerializer',
+    'solidmaterialsconversionfactors': 'apps.manures.serializers.SolidMaterialsConversionFactorsSerializer',
+    'liquidmaterialsconversionfactors': 'apps.manures.serializers.LiquidMaterialsConversionFactorsSerializer',
+    'units': 'apps.manures.serializers.UnitsSerializer',
+    'nmineralizations': 'apps.manures.serializers.NMineralizationSerializer',
+    'ammoniaretentions': 'apps.manures.serializers.AmmoniaRetentionSerializer',
+    'previousyearmanureapplications': 'apps.manures.serializers.PreviousYearManureApplicationsSerializer',
+    'liquidmaterialapplicationusgallonsperacrerateconversions':
+        'apps.manures.serializers.LiquidMaterialApplicationUsGallonsPerAcreRateConversionsSerializer',
+    'solidmaterialapplicationtonperacrerateconversions':
+        'apps.manures.serializers.SolidMaterialApplicationTonPerAcreRateConversionsSerializer',
+    'fertilizertypes': 'apps.fertilizers.serializers.FertilizerTypesSerializer',
+    'fertilizerunits': 'apps.fertilizers.serializers.FertilizerUnitsSerializer',
+    'fertilizers': 'apps.fertilizers.serializers.FertilizersSerializer',
+    'liquidfertilizerdensities': 'apps.fertilizers.serializers.LiquidFertilizerDensitiesSerializer',
+    'densityunits': 'apps.fertilizers.serializers.DensityUnitsSerializer',
+}
+
+# Tables the frontend's APICache loads on every page load, served together by /api/bootstrap/
+BOOTSTRAP_TABLES = (
+    'crops',
+    'cropsconversionfactors',
+    'cropsoiltestphosphorousregions',
+    'cropsoilpotassiumregions',
+    'croptypes',
+    'manures',
+    'nitratecredit',
+    'nmineralizations',
+    'previousyearmanureapplications',
+    'regions',
+    'soiltestmethods',
+    'soiltestphosphorouskelonwaranges',
+    'soiltestphosphorousranges',
+    'soiltestphosphorousrecommendation',
+    'soiltestpotassiumkelownaranges',
+    'soiltestpotassiumranges',
+    'soiltestpotassiumrecommendation',
+    'subregions',
+    'units',
+)
+
+# Columns holding the id of another table's row: endpoint -> {relation: (column, endpoint)}.
+# These aren't ForeignKeys in the database, the fixtures don't guarantee the rows exist.
+# ?expand=<relation> nests the related row, and the manifest lists them for clients.
+TABLE_RELATIONS = {
+    'crops': {
+        'croptype': ('croptypeid', 'croptypes'),
+        'nitrogenrecommendation': ('nitrogenrecommendationid', 'nitrogenrecommendation'),
+    },
+    'previouscroptypes': {
+        'crop': ('cropid', 'crops'),
+        'croptype': ('croptypeid', 'croptypes'),
+    },
+    'cropsoiltestphosphorousregions': {'crop': ('cropid', 'crops')},
+    'cropsoilpotassiumregions': {'crop': ('cropid', 'crops')},
+    'cropyields': {'crop': ('cropid', 'crops')},
+    'animal_subtypes': {'animal': ('animalid', 'animals')},
+    'breeds': {'animal': ('animalid', 'animals')},
+    'subregions': {'region': ('regionid', 'regions')},
+    'liquidfertilizerdensities': {
+        'fertilizer': ('fertilizerid', 'fertilizers'),
+        'densityunit': ('densityunitid', 'densityunits'),
+    },
+}
+
+# Tables whose rows only apply to some regions: endpoint -> (row field, Regions field it must
+# equal). /api/bootstrap/regions/<id>/ sends only a region's rows of these.
+REGION_SCOPED_TABLES = {
+    'subregions': ('regionid', 'id'),
+    'cropyields': ('locationid', 'locationid'),
+    'nmineralizations': ('locationid', 'locationid'),
+    'cropsoiltestphosphorousregions': ('soiltestphosphorousregioncode', 'soiltestphosphorousregioncd'),
+    'soiltestphosphorousrecommendation': ('soiltestphosphorousregioncode', 'soiltestphosphorousregioncd'),
+    'cropsoilpotassiumregions': ('soiltestpotassiumregioncode', 'soiltestpotassiumregioncd'),
+    'soiltestpotassiumrecommendation': ('soiltestpotassiumregioncode', 'soiltestpotassiumregioncd'),
+}
+
+# The bootstrap tables plus cropyields, which is small enough once scoped to a region
+REGION_BOOTSTRAP_TABLES = BOOTSTRAP_TABLES + ('cropyields',)
@@ -0,0 +1,67 @@
+import json
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.crops.models import CropYields
+
+from ..models import Subregion
+from ..snapshot import registry
+from ..views import MAX_BATCH_SIZE
+from .test_snapshot import create_regions
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(3)
+        for subregion_id, region_id in ((1, 1), (2, 1), (3, 2)):
+            Subregion.objects.create(
+                id=subregion_id, name="Subregion %s" % subregion_id,
+                annualprecipitation=100, annualprecipitationocttomar=50, regionid=region_id
+            )
+        CropYields.objects.create(id=1, cropid=12, locationid=3, amount=2.0)
+
+    def tearDown(self):
+        registry.reset()
+
+    def batch(self, paths):
+        response = self.client.post('/api/batch/', {'requests': paths}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['results']
+
+    def test_results_match_individual_requests(self):
+        """Test that each result holds what the route returns on its own, in request order"""
+        paths = ['cropyields/12/3/', 'subregions/1/', '/api/regions/?fields=id']
+        results = self.batch(paths)
+        self.assertEqual([result['path'] for result in results], paths)
+        for path, result in zip(paths, results):
+            response = self.client.get('/api/' + path.removeprefix('/api/'))
+            self.assertEqual(result['status'], 200)
+            self.assertEqual(result['body'], json.loads(response.content))
+            self.assertEqual(result['headers']['ETag'], response['ETag'])
+
+    def test_errors_are_per_result(self):
+        """Test that failing sub-requests don't fail the batch"""
+        results = self.batch(['manures/9/', 'nothing/', 'regions/?fields=colour', 'batch/', 'regions/?ids=1,7'])
+        self.assertEqual([result['status'] for result in results], [404, 404, 400, 405, 200])
+        self.assertEqual(results[1]['body'], {'detail': 'Not found.'})
+        self.assertEqual(results[4]['headers']['X-Missing-Ids'], '7')
+
+    def test_streams_are_rejected(self):
+        """Test that streamed sub-requests get a 400 result instead of failing the batch"""
+        results = self.batch(['crops/?stream=1', 'regions/?stream=true&fields=id', 'regions/'])
+        self.assertEqual([result['status'] for result in results], [400, 400, 200])
+        self.assertEqual(results[0]['body'], {'detail': 'stream can not be batched'})
+
+    def test_batch_runs_without_queries(self):
+        """Test that a batch is served from the snapshot without touching the database"""
+        registry.get()
+        with self.assertNumQueries(0):
+            self.batch(['cropyields/12/3/', 'subregions/2/', 'regions/'])
+
+    def test_invalid_requests(self):
+        """Test that malformed and oversized batches are rejected"""
+        for body in ({}, {'requests': 'regions/'}, {'requests': [1]}, {'requests': ['regions/'] * (MAX_BATCH_SIZE + 1)}):
+            self.assertEqual(self.client.post('/api/batch/', body, format='json').status_code, 400)
@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..breaker import CircuitBreaker, CircuitOpenError
+from ..models import Regions
+from ..snapshot import REFERENCE_TABLES, Payload, SnapshotRegistry, registry
+from .test_snapshot import create_regions
+
+
+def database_down():
+    return patch.object(SnapshotRegistry, '_read_table', side_effect=OperationalError('connection refused'))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def fail_calls(self, breaker, times=1):
+        for _ in range(times):
+            with self.assertRaises(OperationalError), breaker.call():
+                raise OperationalError('connection refused')
+
+    def test_opens_after_consecutive_failures(self):
+        """Test that the breaker opens after failure_threshold failures in a row, not before"""
+        breaker = CircuitBreaker('test', failure_threshold=3)
+        self.fail_calls(breaker, 2)
+        with breaker.call():
+            pass
+        self.fail_calls(breaker, 2)
+        self.assertEqual(breaker.state, 'closed')
+        self.fail_calls(breaker)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError), breaker.call():
+            self.fail('called while open')
+
+    def test_slow_calls_count_as_failures(self):
+        """Test that calls slower than slow_call open the breaker even though they succeed"""
+        breaker = CircuitBreaker('test', failure_threshold=2, slow_call=0)
+        for _ in range(2):
+            with breaker.call():
+                pass
+        self.assertEqual(breaker.state, 'open')
+
+    def test_trial_call_after_reset_timeout(self):
+        """Test that a single trial call is let through once reset_timeout has passed"""
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+        self.fail_calls(breaker)
+        self.assertEqual(breaker.state, 'half-open')
+        self.fail_calls(breaker)
+        self.assertEqual(breaker.state, 'half-open')
+        with breaker.call():
+            self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.retry_after(), 0)
+
+
+class ServeStaleTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(2)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_serves_last_snapshot_while_database_is_down(self):
+        """Test that a stale table keeps being served, marked stale, until the database is back"""
+        self.assertNotIn('X-Snapshot-Stale', self.client.get('/api/regions/'))
+        Regions.objects.filter(id=1).update(name="Renamed")
+        registry.invalidate(Regions)
+        with database_down() as build:
+            for _ in range(5):
+                response = self.client.get('/api/regions/1/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['X-Snapshot-Stale'], '0')
+                self.assertEqual(json.loads(response.content)[0]['name'], "Region 1")
+        self.assertEqual(build.call_count, 3)
+        self.assertEqual(registry.breaker.state, 'open')
+        with patch.object(registry.breaker, 'reset_timeout', 0):
+            response = self.client.get('/api/regions/1/')
+        self.assertNotIn('X-Snapshot-Stale', response)
+        self.assertEqual(json.loads(response.content)[0]['name'], "Renamed")
+
+    def test_no_snapshot_is_unavailable(self):
+        """Test that without any snapshot to serve, requests fail fast with a 503"""
+        with database_down():
+            for _ in range(4):
+                response = self.client.get('/api/regions/')
+                self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.client.get('/api/regions/?stream=1').status_code, 503)
+
+    def test_stream_failures_open_the_breaker(self):
+        """Test that failed streamed queries count towards opening the breaker"""
+        def failing_rows(*args):
+            raise OperationalError('connection refused')
+            yield  # pylint: disable=unreachable
+
+        with patch.object(registry.serializers['regions'], 'iter_queryset', failing_rows):
+            for _ in range(3):
+                response = self.client.get('/api/regions/?stream=1')
+                with self.assertRaises(OperationalError):
+                    b''.join(response.streaming_content)
+        self.assertEqual(registry.breaker.state, 'open')
+        self.assertEqual(self.client.get('/api/regions/?stream=1').status_code, 503)
+
+    def test_serves_snapshot_file(self):
+        """Test that a worker that can't build its snapshot falls back on the snapshot file"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(REFERENCE_SNAPSHOT_PATH=os.path.join(directory, 'snapshot.bin')):
+                built = registry.rebuild()
+                worker = SnapshotRegistry(REFERENCE_TABLES)
+                worker.invalidate()
+                with database_down():
+                    snapshot = worker.get()
+                self.assertEqual(snapshot.content_hash, built.content_hash)
+                self.assertIsNotNone(worker.stale_for())
+                with database_down(), self.assertRaises(OperationalError):
+                    worker.rebuild()
+
+    @override_settings(REFERENCE_DB_SLOW_CALL=0.05, REFERENCE_DB_FAILURE_THRESHOLD=1)
+    def test_compression_is_not_a_slow_call(self):
+        """Test that only reading the rows, not compressing them, counts towards the slow call limit"""
+        worker = SnapshotRegistry(REFERENCE_TABLES)
+        compress = Payload.compressed
+        calls = []
+
+        def slow_compress(payload):
+            if not calls:
+                time.sleep(0.1)
+            calls.append(payload)
+            return compress(payload)
+
+        with patch.object(Payload, 'compressed', slow_compress):
+            worker.get()
+        self.assertEqual(worker.breaker.state, 'closed')
@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+
+from apps.admin.views import database_ping
+from ..snapshot import REFERENCE_TABLES, SnapshotRegistry, registry
+from .test_snapshot import create_regions
+
+
+class HealthCheckTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        database_ping.reset()
+        create_regions(2)
+
+    def tearDown(self):
+        registry.reset()
+        database_ping.reset()
+
+    def test_liveness(self):
+        """Test that the liveness check answers without touching the database"""
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthcheck/live/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_ready_once_bootstrap_is_in_memory(self):
+        """Test that readiness is 503 and starts a load until the bootstrap bundle is built, then 200"""
+        with patch.object(SnapshotRegistry, 'warm_in_background') as warm:
+            response = self.client.get('/healthcheck/ready/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(warm.call_count, 1)
+        body = response.json()
+        self.assertFalse(body['ready'])
+        self.assertFalse(body['snapshot']['loaded'])
+        self.assertTrue(body['database']['reachable'])
+
+        snapshot = registry.get()
+        with patch.object(SnapshotRegistry, 'warm_in_background') as warm:
+            response = self.client.get('/healthcheck/ready/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(warm.called)
+        body = response.json()['snapshot']
+        self.assertEqual(body['content_hash'], snapshot.content_hash)
+        self.assertTrue(body['bootstrap_ready'])
+        self.assertEqual((body['tables_built'], body['tables_to_build']), (len(REFERENCE_TABLES),) * 2)
+        self.assertIsNone(body['stale_for'])
+
+    def test_stale_snapshot_stays_ready(self):
+        """Test that a pod serving its last good snapshot while the database is down stays ready"""
+        registry.get()
+        registry.invalidate(registry.serializers['regions'].Meta.model)
+        with patch.object(SnapshotRegistry, '_read_table', side_effect=OperationalError('connection refused')):
+            registry.get()
+        with patch('apps.admin.views.connection.cursor', side_effect=OperationalError('connection refused')):
+            response = self.client.get('/healthcheck/ready/')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['database'], {'reachable': False, 'error': 'connection refused', 'checked': 0.0})
+        self.assertEqual(body['snapshot']['stale_tables'], ['regions'])
+        self.assertIsNotNone(body['snapshot']['stale_for'])
+
+    def test_database_ping_is_rate_limited(self):
+        """Test that probes between pings are answered from the last ping"""
+        registry.get()
+        with self.assertNumQueries(1):
+            self.client.get('/healthcheck/ready/')
+        with self.assertNumQueries(0):
+            self.client.get('/healthcheck/ready/')
+        with override_settings(HEALTHCHECK_DB_PING_INTERVAL=0), self.assertNumQueries(1):
+            self.client.get('/healthcheck/ready/')
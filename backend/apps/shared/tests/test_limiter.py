@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..limiter import AdaptiveLimiter
+from ..middleware import ConcurrencyLimitMiddleware
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def test_limit_follows_latency(self):
+        """Test that fast requests raise the limit additively and slow ones cut it multiplicatively"""
+        limiter = AdaptiveLimiter(initial_limit=10, min_limit=2, max_limit=12, latency_target=0.1)
+        for _ in range(10):
+            limiter.try_acquire(cheap=True)
+            limiter.release(latency=0.01)
+        self.assertAlmostEqual(limiter.limit, 11, delta=0.1)
+        for _ in range(100):
+            limiter.try_acquire(cheap=True)
+            limiter.release(latency=0.01)
+        self.assertEqual(limiter.limit, 12)
+        limiter.try_acquire(cheap=True)
+        limiter.release(latency=1)
+        self.assertAlmostEqual(limiter.limit, 10.8)
+        # Slow requests finishing together count once
+        limiter.try_acquire(cheap=True)
+        limiter.release(latency=1)
+        self.assertAlmostEqual(limiter.limit, 10.8)
+
+    def test_cheap_requests_have_reserved_capacity(self):
+        """Test that expensive requests stop short of the limit while cheap ones may reach it"""
+        limiter = AdaptiveLimiter(initial_limit=4)
+        for _ in range(3):
+            self.assertTrue(limiter.try_acquire(cheap=False))
+        self.assertFalse(limiter.try_acquire(cheap=False))
+        self.assertTrue(limiter.try_acquire(cheap=True))
+        self.assertFalse(limiter.try_acquire(cheap=True))
+        limiter.release()
+        self.assertFalse(limiter.try_acquire(cheap=False))
+        self.assertEqual(limiter.in_flight, 3)
+
+    def test_waits_for_a_slot(self):
+        """Test that acquire() waits for a slot to come free, and gives up after its timeout"""
+        limiter = AdaptiveLimiter(initial_limit=2)
+        limiter.try_acquire(cheap=True)
+        limiter.try_acquire(cheap=True)
+        self.assertFalse(limiter.acquire(cheap=True, timeout=0.01))
+        self.assertEqual(limiter.rejected, 1)
+        threading.Timer(0.05, limiter.release).start()
+        self.assertTrue(limiter.acquire(cheap=True, timeout=5))
+
+    def test_freed_slot_wakes_cheap_waiters(self):
+        """Test that a slot only a cheap request may take goes to it even with an expensive one waiting first"""
+        limiter = AdaptiveLimiter(initial_limit=4)
+        for cheap in (False, False, False, True):
+            limiter.try_acquire(cheap)
+        results = {}
+
+        def wait(cheap, timeout):
+            results[cheap] = limiter.acquire(cheap, timeout)
+
+        expensive = threading.Thread(target=wait, args=(False, 0.5))
+        expensive.start()
+        while not limiter._condition._waiters:
+            time.sleep(0.001)
+        cheap = threading.Thread(target=wait, args=(True, 5))
+        cheap.start()
+        while len(limiter._condition._waiters) < 2:
+            time.sleep(0.001)
+        start = time.monotonic()
+        limiter.release()
+        cheap.join()
+        self.assertTrue(results[True])
+        self.assertLess(time.monotonic() - start, 0.4)
+        expensive.join()
+        self.assertFalse(results[False])
+
+
+@override_settings(CONCURRENCY_LIMIT_INITIAL=2, CONCURRENCY_LIMIT_QUEUE_TIMEOUT=0.01)
+class ConcurrencyLimitMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def assertShed(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(json.loads(response.content), {'detail': 'The server is busy, try again shortly.'})
+
+    def test_sheds_load_over_limit(self):
+        """Test that expensive requests are shed first, then cheap ones, but never exempt paths"""
+        middleware = ConcurrencyLimitMiddleware(lambda request: HttpResponse('ok'))
+        self.assertEqual(middleware(self.factory.get('/admin/')).status_code, 200)
+        middleware.limiter.try_acquire(cheap=False)
+        self.assertShed(middleware(self.factory.get('/admin/')))
+        self.assertShed(middleware(self.factory.get('/api/regions/?stream=1')))
+        self.assertEqual(middleware(self.factory.get('/api/regions/')).status_code, 200)
+        middleware.limiter.try_acquire(cheap=True)
+        self.assertShed(middleware(self.factory.get('/api/regions/')))
+        self.assertEqual(middleware(self.factory.get('/healthcheck/')).status_code, 200)
+        self.assertEqual(middleware.limiter.in_flight, 2)
+        self.assertEqual(middleware.limiter.rejected, 3)
+
+    def test_streams_hold_their_slot(self):
+        """Test that a streamed response keeps its slot until its body has been sent or it is closed"""
+        middleware = ConcurrencyLimitMiddleware(lambda request: StreamingHttpResponse(iter([b'[', b']'])))
+        response = middleware(self.factory.get('/api/regions/?stream=1'))
+        self.assertEqual(middleware.limiter.in_flight, 1)
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+        self.assertEqual(middleware.limiter.in_flight, 0)
+        middleware(self.factory.get('/api/regions/?stream=1')).close()
+        self.assertEqual(middleware.limiter.in_flight, 0)
+
+    async def test_async_streams_hold_their_slot(self):
+        """Test that an async streamed response keeps its slot until its body has been sent"""
+        async def content():
+            yield b'['
+            yield b']'
+
+        async def view(request):
+            return StreamingHttpResponse(content())
+
+        middleware = ConcurrencyLimitMiddleware(view)
+        response = await middleware(self.factory.get('/api/regions/?stream=1'))
+        self.assertEqual(middleware.limiter.in_flight, 1)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'[]')
+        self.assertEqual(middleware.limiter.in_flight, 0)
+
+    async def test_async(self):
+        """Test that under ASGI requests are limited the same way without blocking the event loop"""
+        async def view(request):
+            return HttpResponse('ok')
+
+        middleware = ConcurrencyLimitMiddleware(view)
+        self.assertEqual((await middleware(self.factory.get('/api/regions/'))).status_code, 200)
+        middleware.limiter.try_acquire(cheap=True)
+        middleware.limiter.try_acquire(cheap=True)
+        self.assertShed(await middleware(self.factory.get('/api/regions/')))
+        self.assertEqual(middleware.limiter.rejected, 1)
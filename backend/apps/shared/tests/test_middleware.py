@@ -0,0 +1,120 @@
+import json
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import SynchronousOnlyOperation
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..snapshot import Payload, registry
+from .test_snapshot import create_regions
+
+
+class ReferenceFastLaneTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(2)
+        registry.get()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_reference_routes_skip_session_and_auth(self):
+        """Test that lookups are answered without loading a session or user"""
+        self.client.cookies['sessionid'] = 'not-a-session'
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/regions/', HTTP_ORIGIN='https://nmp.example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 2)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertIn('Access-Control-Allow-Origin', response)
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertIn('Content-Length', response)
+
+    def test_public_posts_skip_csrf(self):
+        """Test that the POST lookups need no CSRF token, even with a session cookie"""
+        client = APIClient(enforce_csrf_checks=True)
+        client.cookies['sessionid'] = 'not-a-session'
+        response = client.post('/api/batch/', {'requests': ['regions/1/']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['results'][0]['status'], 200)
+
+    def test_other_routes_use_full_stack(self):
+        """Test that routes outside the reference viewsets still get the session middleware"""
+        response = self.client.get('/healthcheck/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+        response = self.client.get('/api/nothing/')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+
+
+class AsyncReferenceTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        create_regions(3)
+
+    def tearDown(self):
+        registry.reset()
+
+    async def test_matches_sync_response(self):
+        """Test that ASGI responses are identical to WSGI ones, building the snapshot if needed"""
+        response = await self.async_client.get('/api/regions/?fields=id,name')
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.client.get)('/api/regions/?fields=id,name')
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_runs_on_event_loop(self):
+        """Test that a lookup doesn't hand off to a worker thread once its payload is built"""
+        await registry.aget()
+        await self.async_client.get('/api/regions/1/')
+        with patch('apps.shared.middleware.sync_to_async') as to_thread:
+            response = await self.async_client.get('/api/regions/1/')
+        self.assertEqual(response.status_code, 200)
+        to_thread.assert_not_called()
+
+    async def test_payload_builds_run_on_thread(self):
+        """Test that payloads missing from their memo aren't built on the event loop"""
+        snapshot = await registry.aget()
+        with self.assertRaises(SynchronousOnlyOperation):
+            snapshot.tables['regions'].page(None, 2)
+        loop_thread = threading.get_ident()
+        threads = []
+        build = Payload.compressed
+
+        def compressed(payload):
+            threads.append(threading.get_ident())
+            return build(payload)
+
+        with patch.object(Payload, 'compressed', compressed):
+            response = await self.async_client.get('/api/regions/?fields=id,name')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(threads)
+        self.assertNotIn(loop_thread, threads)
+
+    async def test_database_access_reruns_on_thread(self):
+        """Test that a view needing the database on the event loop is rerun on a worker thread"""
+        with patch.object(registry, 'aget'):
+            response = await self.async_client.get('/api/regions/1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)[0]['name'], "Region 1")
+
+    async def test_throttled_routes_run_on_thread(self):
+        """Test that batches go straight to a worker thread rather than being rerun on one"""
+        await registry.aget()
+        throttle = 'apps.shared.throttling.TokenBucketThrottle.allow_request'
+        with patch(throttle, autospec=True, return_value=True) as allow:
+            response = await self.async_client.post('/api/batch/', {'requests': ['regions/?fields=id']},
+                                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([call.args[-1].action for call in allow.call_args_list].count('batch'), 1)
+
+    async def test_stream(self):
+        """Test that ?stream=1 streams through the async ORM under ASGI"""
+        response = await self.async_client.get('/api/regions/?stream=1&fields=id')
+        self.assertTrue(response.streaming)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(content), [{'id': 1}, {'id': 2}, {'id': 3}])
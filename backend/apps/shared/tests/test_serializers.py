@@ -0,0 +1,53 @@
+from django.test import TestCase
+from rest_framework import serializers
+
+from apps.crops.models import CropTypes, CropYields, NitrogenRecommendation
+from apps.crops.serializers import CropTypesSerializer, CropYieldsSerializer, NitrogenRecommendationSerializer
+from apps.fertilizers.models import Fertilizers
+from apps.fertilizers.serializers import FertilizersSerializer
+
+from ..serializers import ValuesListModelSerializer
+from ..snapshot import registry, render_json
+
+
+class ValuesListModelSerializerTests(TestCase):
+    def setUp(self):
+        CropTypes.objects.create(
+            id=1, name="Grass", covercrop=True, crudeproteinrequired=False, customcrop=False, modifynitrogen=True
+        )
+        CropYields.objects.create(id=1, cropid=1, locationid=1, amount=None)
+        CropYields.objects.create(id=2, cropid=1, locationid=2, amount=0.1)
+        NitrogenRecommendation.objects.create(id=1, recommendationdesc="Line\u2028separator \"quoted\" é")
+        Fertilizers.objects.create(
+            id=1, name="Urea", dryliquid="dry", nitrogen=46, phosphorous=0, potassium=0, sortnum=1
+        )
+
+    def assert_identical(self, serializer_class):
+        queryset = serializer_class.Meta.model.objects.order_by('pk')
+        expected = render_json(serializer_class(queryset, many=True).data)
+        self.assertEqual(render_json(serializer_class.serialize_queryset(queryset)), expected)
+
+    def test_output_is_byte_identical(self):
+        """Test that booleans, nulls, floats and escaped strings render exactly like DRF"""
+        for serializer_class in (CropTypesSerializer, CropYieldsSerializer,
+                                 NitrogenRecommendationSerializer, FertilizersSerializer):
+            with self.subTest(serializer=serializer_class.__name__):
+                self.assert_identical(serializer_class)
+
+    def test_every_reference_serializer_uses_fast_path(self):
+        """Test that every registered serializer qualifies for the values_list path"""
+        for name, serializer_class in registry.serializers.items():
+            with self.subTest(table=name):
+                self.assertIsNotNone(serializer_class.value_columns())
+
+    def test_declared_fields_fall_back(self):
+        """Test that serializers with non-trivial fields use the regular path"""
+        class RenamedSerializer(ValuesListModelSerializer):
+            label = serializers.CharField(source='name')
+
+            class Meta:
+                model = CropTypes
+                fields = ['id', 'label']
+
+        self.assertIsNone(RenamedSerializer.value_columns())
+        self.assertEqual(RenamedSerializer.serialize_queryset(CropTypes.objects.all()), [{'id': 1, 'label': "Grass"}])
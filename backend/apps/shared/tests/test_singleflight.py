@@ -0,0 +1,171 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from ..singleflight import CoalescedTimeout, SingleFlight
+from ..snapshot import SnapshotRegistry, memoized, payload_flights, registry
+
+
+def run_concurrently(count, func):
+    """Calls func() from count threads once all of them have started, returning the results."""
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        return func()
+
+    with ThreadPoolExecutor(count) as executor:
+        futures = [executor.submit(call) for _ in range(count)]
+        return [future.result() for future in futures]
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        """Test that callers arriving while a key is computed get that computation's result"""
+        flight = SingleFlight('test')
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return object()
+
+        with ThreadPoolExecutor(5) as executor:
+            leader = executor.submit(flight.do, 'key', compute)
+            started.wait(5)
+            followers = [executor.submit(flight.do, 'key', compute) for _ in range(4)]
+            while flight.stats()['coalesced'] < 4:
+                time.sleep(0.001)
+            release.set()
+            results = {id(future.result()) for future in [leader, *followers]}
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(flight.stats(), {'leaders': 1, 'coalesced': 4, 'timeouts': 0, 'in_flight': 0})
+        self.assertEqual(flight.do('key', lambda: 'fresh'), 'fresh')
+        self.assertEqual(flight.leaders, 2)
+
+    def test_errors_are_shared(self):
+        """Test that followers get the exception the computation raised"""
+        flight = SingleFlight('test')
+        release = threading.Event()
+
+        def compute():
+            release.wait(5)
+            raise ValueError('bad row')
+
+        with ThreadPoolExecutor(2) as executor:
+            leader = executor.submit(flight.do, 'key', compute)
+            while not flight.stats()['in_flight']:
+                time.sleep(0.001)
+            follower = executor.submit(flight.do, 'key', compute)
+            while not flight.coalesced:
+                time.sleep(0.001)
+            release.set()
+            for future in (leader, follower):
+                with self.assertRaises(ValueError):
+                    future.result()
+
+    def test_follower_timeout(self):
+        """Test that a follower stops waiting after its timeout"""
+        flight = SingleFlight('test')
+        release = threading.Event()
+        with ThreadPoolExecutor(1) as executor:
+            leader = executor.submit(flight.do, 'key', lambda: release.wait(5))
+            while not flight.stats()['in_flight']:
+                time.sleep(0.001)
+            with self.assertRaises(CoalescedTimeout):
+                flight.do('key', lambda: None, timeout=0.01)
+            release.set()
+            self.assertTrue(leader.result())
+        self.assertEqual(flight.timeouts, 1)
+
+
+class CoalescedLoadTests(SimpleTestCase):
+    def setUp(self):
+        registry.reset()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_concurrent_loads_coalesce(self):
+        """Test that a burst of requests missing the snapshot runs one load between them"""
+        worker = SnapshotRegistry({})
+        release = threading.Event()
+        snapshot = object()
+
+        def slow_load():
+            release.wait(5)
+            return snapshot
+
+        with patch.object(worker, '_load', side_effect=slow_load) as load:
+            threading.Timer(0.1, release.set).start()
+            results = run_concurrently(8, worker.load)
+        self.assertEqual(load.call_count, 1)
+        self.assertTrue(all(result is snapshot for result in results))
+        stats = worker.flight_stats()['snapshot']
+        self.assertEqual((stats['leaders'], stats['coalesced']), (1, 7))
+
+    def test_held_snapshot_is_refreshed_in_background(self):
+        """Test that callers holding a snapshot get it right away while one background load refreshes it"""
+        worker = SnapshotRegistry({})
+        held = worker._snapshot = object()
+        release = threading.Event()
+        with patch.object(worker, '_load', side_effect=lambda: release.wait(5) and held) as load:
+            self.assertIs(worker.load(), held)
+            while not worker.flight_stats()['snapshot']['in_flight']:
+                time.sleep(0.001)
+            for _ in range(4):
+                self.assertIs(worker.load(), held)
+            release.set()
+            while worker.flight_stats()['snapshot']['in_flight']:
+                time.sleep(0.001)
+        self.assertEqual(load.call_count, 1)
+
+    def test_background_warms_start_one_thread(self):
+        """Test that a burst of callers asking for a background load starts a single thread"""
+        worker = SnapshotRegistry({})
+        release = threading.Event()
+        with patch.object(worker, 'warm', side_effect=lambda: release.wait(5)) as warm:
+            run_concurrently(8, worker.warm_in_background)
+            release.set()
+            while worker._warming:
+                time.sleep(0.001)
+        self.assertEqual(warm.call_count, 1)
+
+    @override_settings(REFERENCE_COALESCE_TIMEOUT=0.05)
+    def test_warm_gives_up_on_a_stuck_load(self):
+        """Test that warm() waits at most REFERENCE_COALESCE_TIMEOUT on a load already running"""
+        worker = SnapshotRegistry({})
+        held = worker._snapshot = object()
+        release = threading.Event()
+        with patch.object(worker, '_load', side_effect=lambda: release.wait(5) and held):
+            leader = threading.Thread(target=worker.warm)
+            leader.start()
+            while not worker.flight_stats()['snapshot']['in_flight']:
+                time.sleep(0.001)
+            started = time.monotonic()
+            self.assertIs(worker.warm(), held)
+            self.assertLess(time.monotonic() - started, 1)
+            release.set()
+            leader.join()
+
+    def test_memo_misses_build_once(self):
+        """Test that concurrent misses of a memoized payload build it once"""
+        memo = {}
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.05)
+            return object()
+
+        results = run_concurrently(6, lambda: memoized(memo, 'key', build))
+        self.assertEqual(len(builds), 1)
+        self.assertTrue(all(result is memo['key'] for result in results))
+        self.assertGreaterEqual(payload_flights.coalesced, 1)
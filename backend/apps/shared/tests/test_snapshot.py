@@ -0,0 +1,760 @@
+import gzip
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import brotli
+import msgpack
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.crops.models import Crops, CropYields
+from apps.crops.serializers import CropsSerializer
+from apps.manures.models import Manures
+
+from ..models import Regions, Subregion
+from ..renderers import ColumnarJSONRenderer
+from ..snapshot import BOOTSTRAP_TABLES, REFERENCE_TABLES, TABLE_RELATIONS, Payload, SnapshotRegistry, registry
+
+
+def create_regions(count):
+    for region_id in range(1, count + 1):
+        Regions.objects.create(
+            id=region_id, name="Region %s" % region_id, soiltestphosphorousregioncd=1,
+            soiltestpotassiumregioncd=1, locationid=region_id, sortorder=region_id
+        )
+
+
+class SnapshotRegistryTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        Regions.objects.create(
+            id=1, name="Region 1", soiltestphosphorousregioncd=1,
+            soiltestpotassiumregioncd=1, locationid=1, sortorder=1
+        )
+        for subregion_id, region_id in ((1, 1), (2, 1), (3, 2)):
+            Subregion.objects.create(
+                id=subregion_id, name="Subregion %s" % subregion_id,
+                annualprecipitation=100, annualprecipitationocttomar=50, regionid=region_id
+            )
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_snapshot_contains_every_table(self):
+        """Test that the snapshot builds every registered table"""
+        snapshot = registry.get()
+        self.assertEqual(set(snapshot.tables), set(registry.serializers))
+        self.assertEqual(len(snapshot.tables['subregions'].rows), 3)
+
+    def test_response_matches_serializer(self):
+        """Test that snapshot responses are identical to serializing the queryset"""
+        Crops.objects.create(
+            id=1, cropname="Test Crop", croptypeid=1, yieldcd=1.5, cropremovalfactornitrogen=0.8,
+            cropremovalfactorp2o5=0.6, cropremovalfactork2o=0.7, nitrogenrecommendationid=1,
+            previouscropcode=1, sortnumber=1, manureapplicationhistory=1
+        )
+        response = self.client.get('/api/crops/')
+        self.assertEqual(response.status_code, 200)
+        expected = CropsSerializer(Crops.objects.all(), many=True).data
+        self.assertEqual(json.loads(response.content), json.loads(json.dumps(expected)))
+
+    def test_filtered_response(self):
+        """Test that filtered routes only return matching rows"""
+        response = self.client.get('/api/subregions/1/')
+        self.assertEqual([row['id'] for row in json.loads(response.content)], [1, 2])
+        response = self.client.get('/api/subregions/1/2/')
+        self.assertEqual([row['id'] for row in json.loads(response.content)], [2])
+        response = self.client.get('/api/subregions/9/')
+        self.assertEqual(json.loads(response.content), [])
+
+    def test_save_invalidates_table(self):
+        """Test that saving a row rebuilds only the affected table"""
+        before = registry.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Subregion.objects.create(
+                id=4, name="Subregion 4", annualprecipitation=100, annualprecipitationocttomar=50, regionid=1
+            )
+        after = registry.get()
+        self.assertGreater(after.version, before.version)
+        self.assertEqual(len(after.tables['subregions'].rows), 4)
+        self.assertIs(after.tables['regions'], before.tables['regions'])
+
+    def test_invalidates_once_committed(self):
+        """Test that a save only marks its table stale once committed, so no load reads the rows from before"""
+        registry.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Subregion.objects.filter(id=3).delete()
+            self.assertEqual(registry.status()['stale_tables'], [])
+        self.assertEqual(registry.status()['stale_tables'], ['subregions'])
+
+    def test_delete_invalidates_table(self):
+        """Test that deleting a row removes it from the snapshot"""
+        registry.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Subregion.objects.filter(id=3).delete()
+        self.assertEqual(len(registry.table('subregions').rows), 2)
+
+    def test_no_queries_once_loaded(self):
+        """Test that serving from a loaded snapshot does not query the database"""
+        CropYields.objects.create(id=1, cropid=1, locationid=1, amount=2.0)
+        registry.get()
+        with self.assertNumQueries(0):
+            registry.table('cropyields').filter(cropid=1, locationid=1)
+            registry.table('regions').all  # pylint: disable=pointless-statement
+
+    def test_single_object_not_found(self):
+        """Test that a missing manure returns a 404"""
+        response = self.client.get('/api/manures/1/')
+        self.assertEqual(response.status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            Manures.objects.create(
+                id=1, name="Manure", manureclass="Class", solidliquid="Solid", moisture="Low",
+                nitrogen=1.0, ammonia=1.0, phosphorous=1.0, potassium=1.0, drymatterid=1,
+                nmineralizationid=1, sortnum=1, cubicyardconversion=1.0, nitrate=1.0
+            )
+        response = self.client.get('/api/manures/1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['name'], "Manure")
+
+
+class BootstrapTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(10)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_bootstrap_returns_every_startup_table(self):
+        """Test that the bundle is keyed by every startup endpoint name"""
+        response = self.client.get('/api/bootstrap/')
+        self.assertEqual(response.status_code, 200)
+        bundle = json.loads(response.content)
+        self.assertEqual(list(bundle), list(BOOTSTRAP_TABLES))
+        self.assertEqual(bundle['regions'], json.loads(self.client.get('/api/regions/').content))
+
+    def test_bootstrap_subset(self):
+        """Test that only the requested tables are returned"""
+        response = self.client.get('/api/bootstrap/', {'tables': 'regions,breeds'})
+        self.assertEqual(list(json.loads(response.content)), ['regions', 'breeds'])
+
+    def test_bootstrap_unknown_table(self):
+        """Test that unknown tables are rejected"""
+        response = self.client.get('/api/bootstrap/', {'tables': 'regions,nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bootstrap_gzip(self):
+        """Test that the precompressed bundle is sent to clients accepting gzip"""
+        plain = self.client.get('/api/bootstrap/')
+        response = self.client.get('/api/bootstrap/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        response = self.client.get('/api/bootstrap/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class RegionBootstrapTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(2)
+        for subregion_id, region_id in ((1, 1), (2, 1), (3, 2)):
+            Subregion.objects.create(
+                id=subregion_id, name="Subregion %s" % subregion_id,
+                annualprecipitation=100, annualprecipitationocttomar=50, regionid=region_id
+            )
+        CropYields.objects.create(id=1, cropid=1, locationid=1, amount=1.0)
+        CropYields.objects.create(id=2, cropid=1, locationid=2, amount=2.0)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_scoped_tables_hold_region_rows(self):
+        """Test that region dependent tables only hold the region's rows"""
+        body = json.loads(self.client.get('/api/bootstrap/regions/2/').content)
+        self.assertEqual(list(body), list(BOOTSTRAP_TABLES) + ['cropyields'])
+        self.assertEqual([row['id'] for row in body['subregions']], [3])
+        self.assertEqual([row['id'] for row in body['cropyields']], [2])
+        self.assertEqual(len(body['regions']), 2)
+
+    def test_bundle_is_cached_per_region(self):
+        """Test that each region's bundle is built once and compressed"""
+        snapshot = registry.get()
+        self.assertIs(snapshot.region_bundle(1), snapshot.region_bundle(1))
+        self.assertIsNot(snapshot.region_bundle(1), snapshot.region_bundle(2))
+        self.assertIn('gzip', snapshot.region_bundle(1).encodings)
+
+    def test_unknown_region(self):
+        """Test that an unknown region is a 404"""
+        self.assertEqual(self.client.get('/api/bootstrap/regions/9/').status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        CropYields.objects.create(id=1, cropid=1, locationid=1, amount=2.0)
+        CropYields.objects.create(id=2, cropid=1, locationid=2, amount=3.0)
+        create_regions(10)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_etag_is_emitted(self):
+        """Test that full and filtered responses carry different strong ETags"""
+        full = self.client.get('/api/cropyields/')
+        filtered = self.client.get('/api/cropyields/1/2/')
+        self.assertTrue(full['ETag'].startswith('"'))
+        self.assertNotEqual(full['ETag'], filtered['ETag'])
+
+    def test_matching_etag_returns_304_without_queries(self):
+        """Test that a matching If-None-Match is answered without touching the database"""
+        etag = self.client.get('/api/cropyields/1/2/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/cropyields/1/2/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_changed_data_returns_200(self):
+        """Test that an ETag stops matching once the table changes"""
+        etag = self.client.get('/api/cropyields/')['ETag']
+        CropYields.objects.filter(id=2).update(amount=4.0)
+        registry.invalidate(CropYields)
+        response = self.client.get('/api/cropyields/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_encoded_representation_has_its_own_etag(self):
+        """Test that the gzip bundle and the identity bundle have different validators"""
+        identity = self.client.get('/api/bootstrap/')['ETag']
+        response = self.client.get('/api/bootstrap/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(response['ETag'], identity)
+        response = self.client.get('/api/bootstrap/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=identity)
+        self.assertEqual(response.status_code, 200)
+
+
+class VersionedUrlTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        CropYields.objects.create(id=1, cropid=1, locationid=1, amount=2.0)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_manifest_lists_every_table(self):
+        """Test that the manifest maps each table to its current hash"""
+        manifest = json.loads(self.client.get('/api/manifest/').content)
+        self.assertEqual(set(manifest['tables']), set(registry.serializers))
+        self.assertEqual(manifest['tables']['cropyields'], registry.table('cropyields').content_hash)
+
+    def test_versioned_url_is_immutable(self):
+        """Test that a current versioned URL serves the table with immutable caching"""
+        content_hash = json.loads(self.client.get('/api/manifest/').content)['tables']['cropyields']
+        response = self.client.get('/api/v/%s/cropyields/1/1/' % content_hash)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response.content, self.client.get('/api/cropyields/1/1/').content)
+
+    def test_dataset_version_is_accepted(self):
+        """Test that the manifest's overall version is valid for every table and the bootstrap"""
+        version = json.loads(self.client.get('/api/manifest/').content)['version']
+        self.assertEqual(self.client.get('/api/v/%s/regions/' % version).status_code, 200)
+        self.assertEqual(self.client.get('/api/v/%s/bootstrap/' % version).status_code, 200)
+
+    def test_outdated_version_redirects(self):
+        """Test that an outdated hash redirects to the current one"""
+        response = self.client.get('/api/v/outdated/cropyields/?x=1')
+        self.assertEqual(response.status_code, 302)
+        content_hash = registry.table('cropyields').content_hash
+        self.assertEqual(response['Location'], '/api/v/%s/cropyields/?x=1' % content_hash)
+
+    def test_posts_are_not_versioned(self):
+        """Test that sync/ and batch/ are only routed unversioned"""
+        version = json.loads(self.client.get('/api/manifest/').content)['version']
+        for path in ('sync/', 'batch/'):
+            self.assertEqual(self.client.post('/api/v/%s/%s' % (version, path), {}, format='json').status_code, 404)
+            self.assertNotEqual(self.client.post('/api/%s' % path, {}, format='json').status_code, 404)
+
+    def test_unversioned_url_is_revalidated(self):
+        """Test that unversioned responses must be revalidated"""
+        self.assertEqual(self.client.get('/api/cropyields/')['Cache-Control'], 'no-cache')
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        for subregion_id in range(1, 30):
+            Subregion.objects.create(
+                id=subregion_id, name="Subregion %s" % subregion_id,
+                annualprecipitation=100, annualprecipitationocttomar=50, regionid=1
+            )
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_brotli_is_preferred(self):
+        """Test that Brotli is chosen when the client accepts it"""
+        plain = self.client.get('/api/subregions/')
+        response = self.client.get('/api/subregions/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+    def test_gzip_fallback(self):
+        """Test that gzip is sent to clients without Brotli support"""
+        plain = self.client.get('/api/subregions/1/')
+        response = self.client.get('/api/subregions/1/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_identity(self):
+        """Test that clients without Accept-Encoding get the uncompressed body"""
+        response = self.client.get('/api/subregions/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_bodies_are_not_compressed(self):
+        """Test that tiny responses are never compressed"""
+        response = self.client.get('/api/subregions/1/2/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertNotIn('Accept-Encoding', response.get('Vary', ''))
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(3)
+        for subregion_id, region_id in ((1, 1), (2, 1), (3, 2)):
+            Subregion.objects.create(
+                id=subregion_id, name="Subregion %s" % subregion_id,
+                annualprecipitation=100, annualprecipitationocttomar=50, regionid=region_id
+            )
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_fields_are_projected(self):
+        """Test that only the requested fields are returned, in the table's column order"""
+        response = self.client.get('/api/regions/?fields=name,id')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)[0], {'id': 1, 'name': "Region 1"})
+
+    def test_fields_with_filters(self):
+        """Test that projections apply to filtered routes, even on fields that are filtered on"""
+        response = self.client.get('/api/subregions/1/?fields=id')
+        self.assertEqual(json.loads(response.content), [{'id': 1}, {'id': 2}])
+        response = self.client.get('/api/subregions/9/?fields=id')
+        self.assertEqual(json.loads(response.content), [])
+
+    def test_single_object_fields(self):
+        """Test that the single manure route projects the object"""
+        Manures.objects.create(
+            id=1, name="Manure", manureclass="Class", solidliquid="Solid", moisture="Low",
+            nitrogen=1.0, ammonia=1.0, phosphorous=1.0, potassium=1.0, drymatterid=1,
+            nmineralizationid=1, sortnum=1, cubicyardconversion=1.0, nitrate=1.0
+        )
+        response = self.client.get('/api/manures/1/?fields=id,name')
+        self.assertEqual(json.loads(response.content), {'id': 1, 'name': "Manure"})
+        self.assertEqual(self.client.get('/api/manures/2/?fields=id').status_code, 404)
+
+    def test_projection_is_cached(self):
+        """Test that each spelling of a projection shares one cached payload"""
+        table = registry.table('regions')
+        self.client.get('/api/regions/?fields=id,name')
+        self.assertIs(table.project(('id', 'name')), table.project(('id', 'name')))
+        self.assertEqual(self.client.get('/api/regions/?fields=name,%20id')['ETag'],
+                         self.client.get('/api/regions/?fields=id,name')['ETag'])
+
+    def test_unknown_fields_rejected(self):
+        """Test that unknown fields are a 400 rather than silently dropped"""
+        response = self.client.get('/api/regions/?fields=id,colour')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'detail': 'Unknown fields: colour'})
+
+
+class ColumnarFormatTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(2)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_table_is_column_major(self):
+        """Test that ?format=columnar sends each key once and the values column by column"""
+        response = self.client.get('/api/regions/?format=columnar')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        body = json.loads(response.content)
+        self.assertEqual(body['columns'], list(registry.table('regions').columns))
+        self.assertEqual(body['data'][body['columns'].index('name')], ["Region 1", "Region 2"])
+
+    def test_empty_result_keeps_columns(self):
+        """Test that an empty result still names its columns"""
+        body = json.loads(self.client.get('/api/subregions/9/?format=columnar&fields=id,name').content)
+        self.assertEqual(body, {'columns': ['id', 'name'], 'data': [[], []]})
+        response = self.client.get('/api/subregions/9/?format=columnar&fields=id,name',
+                                   HTTP_ACCEPT='application/json; indent=2')
+        self.assertEqual(json.loads(response.content), body)
+
+    def test_renderer_keeps_shape_of_empty_list(self):
+        """Test that the renderer gives an empty list of rows the columnar shape too"""
+        renderer = ColumnarJSONRenderer()
+        self.assertEqual(json.loads(renderer.render([], renderer_context={'columns': ('id', 'name')})),
+                         {'columns': ['id', 'name'], 'data': [[], []]})
+        self.assertEqual(json.loads(renderer.render([], 'application/json; indent=2')), {'columns': [], 'data': []})
+
+    def test_single_object_is_one_row(self):
+        """Test that the single manure route is one columnar row"""
+        Manures.objects.create(
+            id=1, name="Manure", manureclass="Class", solidliquid="Solid", moisture="Low",
+            nitrogen=1.0, ammonia=1.0, phosphorous=1.0, potassium=1.0, drymatterid=1,
+            nmineralizationid=1, sortnum=1, cubicyardconversion=1.0, nitrate=1.0
+        )
+        body = json.loads(self.client.get('/api/manures/1/?format=columnar&fields=id,name').content)
+        self.assertEqual(body, {'columns': ['id', 'name'], 'data': [[1], ["Manure"]]})
+
+    def test_bootstrap_tables_are_columnar(self):
+        """Test that the bootstrap bundle holds every table in the columnar shape"""
+        body = json.loads(self.client.get('/api/bootstrap/?format=columnar').content)
+        self.assertEqual(list(body), list(BOOTSTRAP_TABLES))
+        self.assertEqual(body['regions']['data'][0], [1, 2])
+        self.assertIs(registry.get().bundle(columnar=True), registry.get().bundle(columnar=True))
+
+    def test_errors_are_not_reshaped(self):
+        """Test that error bodies are rendered as plain JSON"""
+        response = self.client.get('/api/regions/?format=columnar&fields=colour')
+        self.assertEqual(json.loads(response.content), {'detail': 'Unknown fields: colour'})
+
+
+class MessagePackTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(10)
+        CropYields.objects.create(id=1, cropid=1, locationid=1, amount=2.5)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_accept_header_selects_msgpack(self):
+        """Test that Accept: application/msgpack returns the same data as MessagePack"""
+        response = self.client.get('/api/regions/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(self.client.get('/api/regions/').content))
+
+    def test_floats_are_native(self):
+        """Test that floats are encoded as MessagePack floats"""
+        response = self.client.get('/api/cropyields/1/1/', HTTP_ACCEPT='application/msgpack')
+        amount = msgpack.unpackb(response.content)[0]['amount']
+        self.assertIsInstance(amount, float)
+        self.assertEqual(amount, 2.5)
+
+    def test_prebuilt_and_compressed(self):
+        """Test that the MessagePack body is built with the snapshot and has its own validators"""
+        table = registry.table('regions')
+        self.assertIn('msgpack', vars(table.all))
+        self.assertIs(table.all.msgpack, table.all.msgpack)
+        response = self.client.get('/api/regions/', HTTP_ACCEPT='application/msgpack', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), table.all.msgpack.content)
+        self.assertNotEqual(response['ETag'], self.client.get('/api/regions/', HTTP_ACCEPT_ENCODING='gzip')['ETag'])
+
+
+class StreamingTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(5)
+        for subregion_id, region_id in ((1, 1), (2, 1), (3, 2)):
+            Subregion.objects.create(
+                id=subregion_id, name="Subregion %s" % subregion_id,
+                annualprecipitation=100, annualprecipitationocttomar=50, regionid=region_id
+            )
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_stream_matches_snapshot(self):
+        """Test that streamed responses are byte-identical to the snapshot's"""
+        for path in ('/api/regions/', '/api/subregions/1/', '/api/subregions/9/', '/api/regions/?fields=id,name'):
+            separator = '&' if '?' in path else '?'
+            response = self.client.get(path + separator + 'stream=1')
+            self.assertTrue(response.streaming)
+            self.assertEqual(b''.join(response.streaming_content), self.client.get(path).content)
+
+    def test_stream_selects_only_requested_fields(self):
+        """Test that a streamed projection narrows the SELECT itself"""
+        registry.get()
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(self.client.get('/api/regions/?fields=name,id&stream=1').streaming_content)
+        self.assertEqual(json.loads(content)[0], {'name': "Region 1", 'id': 1})
+        select = next(query['sql'] for query in queries.captured_queries if 'FROM "regions"' in query['sql'])
+        self.assertNotIn('sortorder', select)
+
+    @patch('apps.shared.views.STREAM_CHUNK_SIZE', 2)
+    def test_rows_are_encoded_in_chunks(self):
+        """Test that rows are encoded a chunk at a time, after the opening bracket"""
+        response = self.client.get('/api/regions/?stream=1')
+        chunks = list(response.streaming_content)
+        self.assertEqual(chunks[0], b'[')
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(json.loads(b''.join(chunks)), json.loads(self.client.get('/api/regions/').content))
+
+    def test_stream_requires_json(self):
+        """Test that other formats can't be streamed"""
+        self.assertEqual(self.client.get('/api/regions/?stream=1&format=columnar').status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        for yield_id in range(1, 8):
+            CropYields.objects.create(id=yield_id * 10, cropid=1, locationid=yield_id % 2, amount=1.0)
+
+    def tearDown(self):
+        registry.reset()
+
+    def ids(self, response):
+        return [row['id'] for row in json.loads(response.content)]
+
+    def test_pages_follow_the_cursor(self):
+        """Test that following X-Next-Cursor visits every row once, in id order"""
+        response = self.client.get('/api/cropyields/?limit=3')
+        self.assertEqual(self.ids(response), [10, 20, 30])
+        self.assertEqual(response['X-Next-Cursor'], '30')
+        self.assertEqual(response['Link'], '<http://testserver/api/cropyields/?after=30&limit=3>; rel="next"')
+        response = self.client.get('/api/cropyields/?after=30&limit=3')
+        self.assertEqual(self.ids(response), [40, 50, 60])
+        response = self.client.get('/api/cropyields/?after=60&limit=3')
+        self.assertEqual(self.ids(response), [70])
+        self.assertNotIn('X-Next-Cursor', response)
+        self.assertNotIn('Link', response)
+
+    def test_cursor_is_stable(self):
+        """Test that a cursor still works after its row is deleted"""
+        CropYields.objects.get(id=30).delete()
+        self.assertEqual(self.ids(self.client.get('/api/cropyields/?after=30&limit=2')), [40, 50])
+        self.assertEqual(self.ids(self.client.get('/api/cropyields/?after=25&limit=2')), [40, 50])
+
+    def test_cursors_to_the_same_page_share_its_memo(self):
+        """Test that every after between two ids is one memoized page"""
+        table = registry.table('cropyields')
+        first, _ = table.page(None, 3)
+        for after in (-1, -3, 9):
+            self.assertIs(table.page(after, 3)[0], first)
+        self.assertIs(table.page(31, 3)[0], table.page(30, 3)[0])
+        self.assertEqual(len(table._pages), 2)
+
+    def test_pages_past_the_memo_limit_are_not_compressed(self):
+        """Test that pages which won't be stored aren't compressed"""
+        table = registry.table('cropyields')
+        with patch('apps.shared.snapshot.MAX_PROJECTIONS', 1), \
+                patch.object(Payload, 'compressed', autospec=True, side_effect=lambda payload: payload) as compressed:
+            table.page(None, 3)
+            table.page(30, 3)
+        self.assertEqual(compressed.call_count, 1)
+        self.assertEqual(len(table._pages), 1)
+
+    def test_filtered_pages(self):
+        """Test that filtered routes are paged over their matching rows"""
+        response = self.client.get('/api/cropyields/1/1/?limit=2&fields=id')
+        self.assertEqual(json.loads(response.content), [{'id': 10}, {'id': 30}])
+        self.assertEqual(response['X-Next-Cursor'], '30')
+
+    def test_only_after(self):
+        """Test that after without a limit uses the default page size"""
+        self.assertEqual(self.ids(self.client.get('/api/cropyields/?after=50')), [60, 70])
+
+    def test_invalid_parameters(self):
+        """Test that malformed cursors and limits are rejected"""
+        for query in ('after=x', 'limit=0', 'limit=100000', 'limit=2&stream=1'):
+            self.assertEqual(self.client.get('/api/cropyields/?' + query).status_code, 400)
+
+    def test_other_tables_are_not_paged(self):
+        """Test that tables that aren't paginated ignore the parameters"""
+        create_regions(3)
+        self.assertEqual(len(json.loads(self.client.get('/api/regions/?limit=1').content)), 3)
+
+
+class IdsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(10)
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_rows_in_requested_order(self):
+        """Test that ?ids= returns the rows in the order they were asked for"""
+        response = self.client.get('/api/regions/?ids=9,1,5,1')
+        self.assertEqual([row['id'] for row in json.loads(response.content)], [9, 1, 5])
+        self.assertNotIn('X-Missing-Ids', response)
+
+    def test_missing_ids_reported(self):
+        """Test that ids without a row are listed in X-Missing-Ids"""
+        response = self.client.get('/api/regions/?ids=2,40,3,41&fields=id')
+        self.assertEqual(json.loads(response.content), [{'id': 2}, {'id': 3}])
+        self.assertEqual(response['X-Missing-Ids'], '40,41')
+
+    def test_ids_within_filters(self):
+        """Test that ids outside the route's filters count as missing"""
+        response = self.client.get('/api/regions/4/?ids=4,5')
+        self.assertEqual([row['id'] for row in json.loads(response.content)], [4])
+        self.assertEqual(response['X-Missing-Ids'], '5')
+
+    def test_invalid_ids(self):
+        """Test that malformed ids and combinations with other modes are rejected"""
+        for query in ('ids=a,b', 'ids=1&stream=1', 'ids=1&after=1'):
+            self.assertEqual(self.client.get('/api/cropyields/?' + query).status_code, 400)
+
+
+class ExpandTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(2)
+        for subregion_id, region_id in ((1, 1), (2, 1), (3, 9)):
+            Subregion.objects.create(
+                id=subregion_id, name="Subregion %s" % subregion_id,
+                annualprecipitation=100, annualprecipitationocttomar=50, regionid=region_id
+            )
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_relations_are_consistent(self):
+        """Test that every relation joins an existing column to an existing table"""
+        snapshot = registry.get()
+        for name, relations in TABLE_RELATIONS.items():
+            for column, target in relations.values():
+                self.assertIn(column, snapshot.tables[name].columns)
+                self.assertIn(target, snapshot.tables)
+
+    def test_related_rows_are_nested(self):
+        """Test that ?expand= nests the related row, or null where it doesn't exist"""
+        registry.get()
+        with self.assertNumQueries(0):
+            body = json.loads(self.client.get('/api/subregions/?expand=region').content)
+        self.assertEqual(body[0]['region'], json.loads(self.client.get('/api/regions/').content)[0])
+        self.assertIsNone(body[2]['region'])
+
+    def test_expand_with_other_parameters(self):
+        """Test that expansion works with filters, fields, ids and columnar output"""
+        body = json.loads(self.client.get('/api/subregions/1/?expand=region&fields=id,region&ids=2').content)
+        self.assertEqual(body, [{'id': 2, 'region': {
+            'id': 1, 'name': "Region 1", 'soiltestphosphorousregioncd': 1, 'soiltestpotassiumregioncd': 1,
+            'locationid': 1, 'sortorder': 1}}])
+        body = json.loads(self.client.get('/api/subregions/?expand=region&format=columnar&fields=id,region').content)
+        self.assertEqual(body['columns'], ['id', 'region'])
+
+    def test_expansion_is_cached(self):
+        """Test that each combination of relations is built once"""
+        snapshot = registry.get()
+        self.assertIs(snapshot.expanded('subregions', ('region',)), snapshot.expanded('subregions', ('region',)))
+        self.assertIs(snapshot.expanded('subregions', ()), snapshot.tables['subregions'])
+
+    def test_versioned_expansion_follows_related_tables(self):
+        """Test that changing a related row moves an expanded route to a new versioned URL"""
+        snapshot = registry.get()
+        content_hash = snapshot.expanded_hash('subregions', ('region',))
+        self.assertNotEqual(content_hash, snapshot.tables['subregions'].content_hash)
+        path = '/api/v/%s/subregions/1/?expand=region'
+        self.assertEqual(self.client.get(path % content_hash).status_code, 200)
+        self.assertEqual(self.client.get(path % snapshot.tables['subregions'].content_hash).status_code, 302)
+        with self.captureOnCommitCallbacks(execute=True):
+            Regions.objects.filter(id=1).update(name="Renamed")
+            registry.invalidate(Regions)
+        response = self.client.get(path % content_hash)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], path % registry.get().expanded_hash('subregions', ('region',)))
+        self.assertEqual(json.loads(self.client.get(response['Location']).content)[0]['region']['name'], "Renamed")
+
+    def test_unknown_relation(self):
+        """Test that relations a table doesn't have are rejected"""
+        response = self.client.get('/api/regions/?expand=subregion')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'detail': 'Unknown relations: subregion'})
+        self.assertEqual(self.client.get('/api/subregions/?expand=region&stream=1').status_code, 400)
+
+    def test_manifest_lists_relations(self):
+        """Test that the manifest describes the relations for clients"""
+        manifest = json.loads(self.client.get('/api/manifest/').content)
+        self.assertEqual(manifest['relations']['subregions'], {'region': {'column': 'regionid', 'table': 'regions'}})
+
+
+class SnapshotFileTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'snapshot.bin')
+        self.settings = override_settings(REFERENCE_SNAPSHOT_PATH=self.path, REFERENCE_SNAPSHOT_CHECK_INTERVAL=0)
+        self.settings.enable()
+        create_regions(10)
+        CropYields.objects.create(id=1, cropid=1, locationid=1, amount=2.0)
+
+    def tearDown(self):
+        self.settings.disable()
+        registry.reset()
+        self.directory.cleanup()
+
+    def test_worker_maps_file_without_queries(self):
+        """Test that a new worker serves the snapshot written by another one without the database"""
+        built = registry.rebuild()
+        worker = SnapshotRegistry(REFERENCE_TABLES)
+        with self.assertNumQueries(0):
+            mapped = worker.get()
+            table = mapped.tables['cropyields']
+            self.assertIsInstance(table.all.content, memoryview)
+            rows = list(table.filter(cropid=1, locationid=1).data)
+            self.assertEqual(rows, [{'id': 1, 'cropid': 1, 'locationid': 1, 'amount': 2.0}])
+            self.assertEqual(bytes(mapped.bundle().encodings['gzip']), built.bundle().encodings['gzip'])
+            self.assertEqual(bytes(table.all.msgpack.content), built.tables['cropyields'].all.msgpack.content)
+        self.assertEqual(mapped.content_hash, built.content_hash)
+        self.assertEqual(mapped.versions, built.versions)
+        for name, built_table in built.tables.items():
+            self.assertEqual(bytes(mapped.tables[name].all.content), built_table.all.content)
+
+    def test_loaddata_rewrites_file(self):
+        """Test that loaddata run in another process reaches the workers through the file"""
+        registry.rebuild()
+        worker = SnapshotRegistry(REFERENCE_TABLES)
+        before = worker.table('regions').content_hash
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('loaddata', 'regions', verbosity=0)
+        self.assertNotEqual(worker.table('regions').content_hash, before)
+        self.assertEqual(worker.table('regions').rows, list(Regions.objects.order_by('id').values(
+            *registry.table('regions').columns)))
+
+    def test_rewritten_file_is_picked_up(self):
+        """Test that a worker remaps the file after another worker rebuilds it"""
+        registry.rebuild()
+        worker = SnapshotRegistry(REFERENCE_TABLES)
+        self.assertEqual(len(worker.table('cropyields').rows), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            CropYields.objects.create(id=2, cropid=1, locationid=2, amount=3.0)
+        registry.get()
+        self.assertEqual(len(worker.table('cropyields').rows), 2)
+
+    def test_mismatched_file_is_ignored(self):
+        """Test that a file for a different set of tables falls back to the database"""
+        registry.rebuild()
+        worker = SnapshotRegistry({'regions': REFERENCE_TABLES['regions']})
+        self.assertEqual(len(worker.table('regions').rows), 10)
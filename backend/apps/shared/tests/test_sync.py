@@ -0,0 +1,125 @@
+import json
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..models import Regions, TableVersion
+from ..snapshot import BOOTSTRAP_TABLES, registry
+from .test_snapshot import create_regions
+
+
+def table_version(name):
+    return TableVersion.objects.get(name=name).version
+
+
+class TableVersionTests(TestCase):
+    def setUp(self):
+        registry.reset()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_saves_and_deletes_bump_version(self):
+        """Test that every save or delete of a row bumps its table's version"""
+        create_regions(2)
+        self.assertEqual(table_version('regions'), 2)
+        Regions.objects.get(id=1).delete()
+        self.assertEqual(table_version('regions'), 3)
+        self.assertFalse(TableVersion.objects.filter(name='subregions').exists())
+
+    def test_loaddata_bumps_each_table_once(self):
+        """Test that loading a fixture bumps each loaded table once rather than once per row"""
+        call_command('loaddata', 'regions', 'subregion', verbosity=0)
+        self.assertEqual(table_version('regions'), 1)
+        self.assertEqual(table_version('subregions'), 1)
+
+    def test_loaddata_only_bumps_changed_tables(self):
+        """Test that reloading a fixture bumps only the tables whose rows it changed"""
+        call_command('loaddata', 'regions', 'subregion', verbosity=0)
+        call_command('loaddata', 'regions', 'subregion', verbosity=0)
+        self.assertEqual(table_version('regions'), 1)
+        # A queryset update doesn't send post_save, so only the reload notices it
+        Regions.objects.filter(id=1).update(name="Renamed")
+        call_command('loaddata', 'regions', 'subregion', verbosity=0)
+        self.assertEqual(table_version('regions'), 2)
+        self.assertEqual(table_version('subregions'), 1)
+
+    def test_loaddata_only_hashes_loaded_tables(self):
+        """Test that loaddata only reads back the tables of the models its fixtures hold"""
+        with patch.object(registry, 'read_hashes', wraps=registry.read_hashes) as read_hashes:
+            call_command('loaddata', 'regions', verbosity=0)
+        read = set().union(*(call.args[0] for call in read_hashes.call_args_list))
+        self.assertEqual(read, set(registry.names_for_model(Regions)))
+
+    def test_snapshot_records_versions(self):
+        """Test that each table in the snapshot carries the version its rows were read at"""
+        create_regions(3)
+        snapshot = registry.get()
+        self.assertEqual(snapshot.tables['regions'].version, 3)
+        self.assertEqual(snapshot.tables['subregions'].version, 0)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        create_regions(10)
+
+    def tearDown(self):
+        registry.reset()
+
+    def sync(self, body):
+        response = self.client.post('/api/sync/', body, format='json')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_first_sync_sends_every_table(self):
+        """Test that a client holding nothing gets every bootstrap table in full"""
+        result = self.sync({})
+        self.assertEqual(list(result['tables']), list(BOOTSTRAP_TABLES))
+        self.assertEqual(len(result['tables']['regions']), 10)
+        self.assertEqual(result['versions']['regions'], 10)
+        self.assertEqual(result['changes'], {})
+
+    def test_current_client_gets_nothing(self):
+        """Test that tables already held at their current version are left out"""
+        versions = self.sync({})['versions']
+        result = self.sync({'versions': versions})
+        self.assertEqual(result, {'versions': versions, 'tables': {}, 'changes': {}})
+
+    def test_changed_table_sends_row_changes(self):
+        """Test that a table changed since a version this process has seen sends only the changed rows"""
+        versions = self.sync({'tables': ['regions']})['versions']
+        registry.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            region = Regions.objects.get(id=2)
+            region.name = "Renamed"
+            region.save()
+            Regions.objects.get(id=3).delete()
+        result = self.sync({'versions': versions, 'tables': ['regions']})
+        self.assertEqual(result['versions'], {'regions': 12})
+        self.assertEqual(result['tables'], {})
+        self.assertEqual(result['changes']['regions']['deletes'], [3])
+        self.assertEqual([row['name'] for row in result['changes']['regions']['upserts']], ["Renamed"])
+
+    def test_unknown_version_sends_table(self):
+        """Test that a version this process never held gets the whole table"""
+        result = self.sync({'versions': {'regions': 4}, 'tables': ['regions']})
+        self.assertEqual(len(result['tables']['regions']), 10)
+        self.assertEqual(result['changes'], {})
+
+    def test_later_version_is_kept(self):
+        """Test that a client ahead of this process keeps its version rather than going back"""
+        result = self.sync({'versions': {'regions': 99}, 'tables': ['regions']})
+        self.assertEqual(result, {'versions': {'regions': 99}, 'tables': {}, 'changes': {}})
+
+    def test_invalid_requests(self):
+        """Test that malformed bodies and unknown tables are rejected"""
+        for body in ({'versions': []}, {'versions': {'regions': '1'}}, {'tables': 'regions'}, ['regions']):
+            response = self.client.post('/api/sync/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/sync/', {'tables': ['regions', 'nope']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'detail': 'Unknown tables: nope'})
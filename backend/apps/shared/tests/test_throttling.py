@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..snapshot import registry
+from ..throttling import TokenBuckets, local_buckets, parse_rate
+from .test_snapshot import create_regions
+
+RATES = {'batch': '2/min', 'batch_total': '3/min'}
+
+
+class TokenBucketsTests(SimpleTestCase):
+    def test_burst_then_refill(self):
+        """Test that a bucket allows a burst of its capacity and then refills at its rate"""
+        buckets = TokenBuckets()
+        capacity, rate = parse_rate('3/s')
+        self.assertEqual((capacity, rate), (3, 3.0))
+        self.assertEqual([buckets.take('client', capacity, rate, now=100) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(buckets.take('client', capacity, rate, now=100), 1 / 3)
+        self.assertEqual(buckets.take('other', capacity, rate, now=100), 0)
+        self.assertEqual(buckets.take('client', capacity, rate, now=100.34), 0)
+        self.assertGreater(buckets.take('client', capacity, rate, now=100.34), 0)
+        self.assertEqual([buckets.take('client', capacity, rate, now=200) for _ in range(3)], [0, 0, 0])
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': RATES})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        local_buckets.clear()
+        cache.clear()
+        create_regions(1)
+
+    def tearDown(self):
+        registry.reset()
+        local_buckets.clear()
+
+    def batch(self, address):
+        client = APIClient(REMOTE_ADDR=address)
+        return client.post('/api/batch/', {'requests': ['regions/']}, format='json')
+
+    def assertThrottleSequence(self):
+        self.assertEqual([self.batch('10.0.0.1').status_code for _ in range(3)], [200, 200, 429])
+        # Only one left for everyone together
+        self.assertEqual(self.batch('10.0.0.2').status_code, 200)
+        response = self.batch('10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_per_client_and_route(self):
+        """Test that clients have their own buckets, within the route's shared one"""
+        self.assertThrottleSequence()
+
+    @override_settings(THROTTLE_CACHE='default')
+    def test_cache_backend(self):
+        """Test that buckets can be kept in the cache instead, with the same outcome"""
+        self.assertThrottleSequence()
+        self.assertIsNotNone(cache.get("throttle_bucket_batch_total_"))
+
+    def test_lookups_are_not_throttled(self):
+        """Test that routes without a throttle scope are never throttled"""
+        client = APIClient()
+        for _ in range(10):
+            self.assertEqual(client.get('/api/regions/').status_code, 200)
@@ -0,0 +1,126 @@
+"""
+Token-bucket throttles for the expensive API routes.
+
+DRF's rate throttles keep each client's request history in the cache and read and write it
+on every check. These keep a token bucket per client in process instead, so a check is a
+dict lookup under a lock. Setting THROTTLE_CACHE to a cache alias shares the buckets between
+workers through that cache, at the cost of a round trip per check again.
+
+Rates are DRF's DEFAULT_THROTTLE_RATES strings: '<n>/<period>' gives a bucket of n tokens
+that refills at n per period, so a client can burst n requests and then sustain the rate.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# In-process buckets kept, beyond which the least recently used are dropped. Those have
+# usually refilled, and a full bucket and a missing one are the same.
+MAX_BUCKETS = 10000
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """(capacity, tokens per second) of a '<n>/<period>' rate."""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+def refill(bucket, capacity, rate, now):
+    """Tokens in a (tokens, updated) bucket at now, or a full bucket if there is none."""
+    if bucket is None:
+        return capacity
+    tokens, updated = bucket
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class TokenBuckets:
+    """Buckets held in this process, up to MAX_BUCKETS of them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, capacity, rate, now):
+        """Takes a token from key's bucket. Returns 0 if it could, else the seconds until it can."""
+        with self._lock:
+            tokens = refill(self._buckets.pop(key, None), capacity, rate, now)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheTokenBuckets:
+    """
+    Buckets shared through a Django cache. Reading and writing a bucket isn't atomic, so
+    concurrent requests may now and then both take its last token.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def take(self, key, capacity, rate, now):
+        cache_key = 'throttle_bucket_%s_%s' % key
+        tokens = refill(self.cache.get(cache_key), capacity, rate, now)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        # Kept until it would have refilled, when a missing bucket means the same thing
+        self.cache.set(cache_key, (tokens, now), (capacity - tokens) / rate + 1)
+        return wait
+
+
+local_buckets = TokenBuckets()
+
+
+def token_buckets():
+    alias = getattr(settings, 'THROTTLE_CACHE', None)
+    return local_buckets if alias is None else CacheTokenBuckets(caches[alias])
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles views with a throttle_scope through two buckets: one per client (by address)
+    at the scope's rate, then one shared by every client at the '<scope>_total' rate, which
+    keeps many clients together from crowding out the cheap lookups. Requests turned away
+    by their client's bucket don't draw on the shared one. Views without a scope, and
+    buckets without a rate, aren't throttled.
+    """
+    timer = time.time
+
+    def __init__(self):
+        self._wait = 0
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        buckets = token_buckets()
+        now = self.timer()
+        for name, key in ((scope, self.get_ident(request)), (scope + '_total', '')):
+            rate = api_settings.DEFAULT_THROTTLE_RATES.get(name)
+            if rate is None:
+                continue
+            self._wait = buckets.take((name, key), *parse_rate(rate), now)
+            if self._wait:
+                return False
+        return True
+
+    def wait(self):
+        return self._wait
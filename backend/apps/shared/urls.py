@@ -2,11 +2,20 @@ from django.urls import path
 
 from .views import SharedViewset
 
-urlpatterns = [
+# The GET routes to reference data, also mounted under api/v/<content_version>/ (see config/urls.py)
+reference_urlpatterns = [
     path('regions/', SharedViewset.as_view({'get': 'regions'})),
     path('regions/<int:regionId>/', SharedViewset.as_view({'get': 'regions'})),
     path('subregions/', SharedViewset.as_view({'get': 'subregions'})),
     path('subregions/<int:regionId>/', SharedViewset.as_view({'get': 'subregions'})),
     path('subregions/<int:regionId>/<int:subregionId>/', SharedViewset.as_view({'get': 'subregions'})),
     path('nitratecredit/', SharedViewset.as_view({'get': 'nitratecredit'})),
+    path('bootstrap/', SharedViewset.as_view({'get': 'bootstrap'})),
+    path('bootstrap/regions/<int:regionId>/', SharedViewset.as_view({'get': 'regionBootstrap'})),
+    path('manifest/', SharedViewset.as_view({'get': 'manifest'})),
+]
+
+urlpatterns = reference_urlpatterns + [
+    path('sync/', SharedViewset.as_view({'post': 'sync'})),
+    path('batch/', SharedViewset.as_view({'post': 'batch'})),
 ]
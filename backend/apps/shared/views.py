@@ -1,36 +1,456 @@
+import math
+from urllib.parse import urlsplit
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DatabaseError
+from django.http import (HttpRequest, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, JsonResponse,
+                         QueryDict, StreamingHttpResponse)
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .renderers import ColumnarJSONRenderer, MessagePackRenderer, aiter_json_array, iter_json_array, msgpack
+from .singleflight import CoalescedTimeout
+from .snapshot import BOOTSTRAP_TABLES, TABLE_RELATIONS, Payload, registry, render_json
+
+# Content under /api/v/<hash>/ never changes, so caches may keep it as long as they like
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Rows fetched and encoded at a time by ?stream=1 responses
+STREAM_CHUNK_SIZE = 2000
+
+# Tables large enough to be worth paging through with ?after=<id>&limit=<n>
+KEYSET_PAGINATED_TABLES = frozenset({
+    'soiltestphosphorousrecommendation',
+    'soiltestpotassiumrecommendation',
+    'cropsoiltestphosphorousregions',
+    'cropsoilpotassiumregions',
+    'cropyields',
+})
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Sub-requests accepted by one /api/batch/ call
+MAX_BATCH_SIZE = 50
+# Sub-response headers passed on in /api/batch/ results
+BATCH_RESULT_HEADERS = ('ETag', 'Location', 'Link', 'X-Next-Cursor', 'X-Missing-Ids')
+
+
+class ReferenceDataUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Reference data is unavailable, try again later.'
+    default_code = 'reference_data_unavailable'
+
+
+def accepted_encoding(request, available):
+    """The first of the available content codings the client accepts, if any."""
+    accepted = set()
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.partition(';')
+        key, _, quality = params.strip().partition('=')
+        try:
+            if key.strip() == 'q' and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in available:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def reference_route(path):
+    """The URL match for path if it is served by a reference viewset, otherwise None."""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if not issubclass(getattr(match.func, 'cls', object), ReferenceViewset):
+        return None
+    return match
+
+
+def batch_subrequest(parent, path):
+    """
+    Runs a GET for path (relative to /api/) through the URLconf and straight into its
+    reference viewset, without the middleware stack. Paths that are not reference routes
+    get a 404, and ?stream=1, whose body can't be inlined in the batch's, a 400.
+    """
+    url = urlsplit('/api/' + path.removeprefix('/').removeprefix('api/'))
+    match = reference_route(url.path)
+    if match is None:
+        return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    if QueryDict(url.query).get('stream') in ('1', 'true'):
+        return JsonResponse({'detail': 'stream can not be batched'}, status=status.HTTP_400_BAD_REQUEST)
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = url.path
+    request.META = {
+        key: value for key, value in parent.META.items()
+        if key not in ('HTTP_ACCEPT_ENCODING', 'HTTP_IF_NONE_MATCH', 'CONTENT_TYPE', 'CONTENT_LENGTH')
+    }
+    request.META.update(PATH_INFO=url.path, QUERY_STRING=url.query, REQUEST_METHOD='GET',
+                        HTTP_ACCEPT='application/json')
+    request.GET = QueryDict(url.query)
+    for name in ('user', 'session'):
+        if hasattr(parent, name):
+            setattr(request, name, getattr(parent, name))
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def etag_matches(request, etag):
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in (tag.removeprefix('W/') for tag in etags)
+
+
+class ReferenceViewset(viewsets.ViewSet):
+    """
+    Base for the read-only lookup viewsets, which serve from the reference snapshot.
+
+    Every route is also mounted under /api/v/<hash>/, where <hash> is the table's hash from
+    /api/manifest/ (or the manifest's overall version). Those responses are cacheable forever;
+    a hash that is no longer current redirects to the current one.
+
+    Every route takes ?fields=a,b to return only those fields of each row, and
+    ?format=columnar to return {"columns": [...], "data": [[column values], ...]}. With msgpack
+    installed, Accept: application/msgpack returns the same data as MessagePack.
+
+    Table routes also take ?stream=1, which reads the rows straight from the database and
+    streams the JSON as it is encoded, holding only STREAM_CHUNK_SIZE rows at a time.
+
+    The KEYSET_PAGINATED_TABLES take ?after=<id>&limit=<n> to return a page of rows in id
+    order. The next page's URL is in the Link header and its after value in X-Next-Cursor;
+    both are missing on the last page.
+
+    Table routes take ?ids=1,5,9 to return just those rows, in that order. Ids with no
+    matching row are listed in the X-Missing-Ids header.
+
+    Tables with TABLE_RELATIONS take ?expand=a,b to nest each row's related rows under those
+    names, so clients don't have to join tables themselves. Expanded routes are versioned by
+    Snapshot.expanded_hash(), which covers the related tables too.
+
+    stream, ids and after/limit can't be combined, and stream can't be expanded.
+
+    Everything here is public, so no authentication runs, and ReferenceFastLaneMiddleware
+    routes these requests past the session and auth middleware too. Under ASGI it runs
+    them on the event loop, as they only touch the database when the snapshot is rebuilt
+    or for ?stream=1, which then reads the rows through the async ORM.
+
+    While the database is down the last good snapshot is served, with the seconds it has
+    been stale for in X-Snapshot-Stale (see SnapshotRegistry). With no snapshot at all, or
+    for ?stream=1 while the database circuit breaker is open, requests get a 503.
+    """
+
+    authentication_classes = ()
+    # Actions throttled with their own rates, see apps/shared/throttling.py
+    throttle_scopes = {'batch': 'batch', 'sync': 'sync'}
+    renderer_classes = [
+        *api_settings.DEFAULT_RENDERER_CLASSES,
+        ColumnarJSONRenderer,
+        *([MessagePackRenderer] if msgpack is not None else []),
+    ]
+    content_version = None
 
-from .models import Regions, Subregion, NitrateCredit
-from .serializers import RegionsSerializer, SubregionSerializer, NitrateCreditSerializer
+    @property
+    def throttle_scope(self):
+        return self.throttle_scopes.get(getattr(self, 'action', None))
 
+    def dispatch(self, request, *args, **kwargs):
+        self.content_version = kwargs.pop('content_version', None)
+        return super().dispatch(request, *args, **kwargs)
 
-class SharedViewset(viewsets.ViewSet):
+    def handle_exception(self, exc):
+        if not isinstance(exc, (DatabaseError, CoalescedTimeout)):
+            return super().handle_exception(exc)
+        # Only reached with no snapshot to fall back on, see SnapshotRegistry.load
+        response = super().handle_exception(ReferenceDataUnavailable())
+        response['Retry-After'] = str(max(1, math.ceil(registry.breaker.retry_after())))
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        stale_for = registry.stale_for()
+        if stale_for is not None:
+            response['X-Snapshot-Stale'] = str(int(stale_for))
+        return response
+
+    def reference_response(self, request, endpoint, **filters):
+        snapshot = registry.get()
+        relations = self.requested_relations(request, endpoint)
+        content_hash = snapshot.expanded_hash(endpoint, relations)
+        if not self.is_current_version(snapshot, content_hash):
+            return self.current_version_redirect(request, content_hash)
+        table = snapshot.expanded(endpoint, relations)
+        fields = self.requested_fields(request, table)
+        page = self.requested_page(request, endpoint)
+        ids = self.requested_ids(request)
+        stream = request.query_params.get('stream') in ('1', 'true')
+        if sum((page is not None, ids is not None, stream)) > 1:
+            raise ParseError('stream, ids and after/limit can not be combined')
+        if stream and relations:
+            raise ParseError('stream can not be combined with expand')
+        if stream:
+            return self.streaming_response(request, endpoint, fields, **filters)
+        if page is not None:
+            return self.page_response(request, table, page, fields, **filters)
+        if ids is not None:
+            return self.ids_response(request, table, ids, fields, **filters)
+        if fields is not None:
+            payload = table.project(fields, **filters)
+        else:
+            payload = table.filter(**filters) if filters else table.all
+        return self.payload_response(request, self.rows_payload(request, table, payload, fields))
+
+    def reference_object_response(self, request, endpoint, pk):
+        snapshot = registry.get()
+        relations = self.requested_relations(request, endpoint)
+        content_hash = snapshot.expanded_hash(endpoint, relations)
+        if not self.is_current_version(snapshot, content_hash):
+            return self.current_version_redirect(request, content_hash)
+        table = snapshot.expanded(endpoint, relations)
+        fields = self.requested_fields(request, table)
+        return self.payload_response(request, self.rows_payload(request, table, table.get(pk, fields), fields))
+
+    def page_response(self, request, table, page, fields, **filters):
+        payload, next_after = table.page(*page, fields=fields, **filters)
+        response = self.payload_response(request, self.rows_payload(request, table, payload, fields))
+        if next_after is not None:
+            url = replace_query_param(request.build_absolute_uri(), 'after', next_after)
+            response['Link'] = '<%s>; rel="next"' % replace_query_param(url, 'limit', page[1])
+            response['X-Next-Cursor'] = str(next_after)
+        return response
+
+    def ids_response(self, request, table, ids, fields, **filters):
+        payload, missing = table.lookup(ids, fields, **filters)
+        response = self.payload_response(request, self.rows_payload(request, table, payload, fields))
+        if missing:
+            response['X-Missing-Ids'] = ','.join(str(pk) for pk in missing)
+        return response
+
+    def streaming_response(self, request, endpoint, fields, **filters):
+        renderer = request.accepted_renderer
+        if isinstance(renderer, ColumnarJSONRenderer) or not isinstance(renderer, JSONRenderer):
+            raise ParseError('stream is only available for JSON')
+        serializer_class = registry.serializers[endpoint]
+        if registry.breaker.state == 'open':
+            raise ReferenceDataUnavailable()
+        queryset = serializer_class.Meta.model.objects.filter(**filters).order_by('pk')
+        if isinstance(request._request, ASGIRequest):
+            # Under ASGI the rows are read through the async ORM, see aiter_queryset()
+            rows = registry.breaker.aiterate(serializer_class.aiter_queryset(queryset, STREAM_CHUNK_SIZE, fields))
+            content = aiter_json_array(rows, STREAM_CHUNK_SIZE)
+        else:
+            rows = registry.breaker.iterate(serializer_class.iter_queryset(queryset, STREAM_CHUNK_SIZE, fields))
+            content = iter_json_array(rows, STREAM_CHUNK_SIZE)
+        response = StreamingHttpResponse(content, content_type=renderer.media_type)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def requested_page(self, request, endpoint):
+        """(after, limit) from ?after= and ?limit=, or None when the route isn't paged."""
+        after = request.query_params.get('after')
+        limit = request.query_params.get('limit')
+        if endpoint not in KEYSET_PAGINATED_TABLES or (after is None and limit is None):
+            return None
+        try:
+            after = int(after) if after is not None else None
+            limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+        except ValueError as error:
+            raise ParseError('after and limit must be integers') from error
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ParseError('limit must be between 1 and %s' % MAX_PAGE_SIZE)
+        return after, limit
+
+    def requested_ids(self, request):
+        """The ids named by ?ids=, without duplicates, or None to not select by id."""
+        ids = request.query_params.get('ids')
+        if ids is None:
+            return None
+        try:
+            ids = tuple(dict.fromkeys(int(pk) for pk in ids.split(',') if pk.strip()))
+        except ValueError as error:
+            raise ParseError('ids must be a comma separated list of integers') from error
+        if len(ids) > MAX_PAGE_SIZE:
+            raise ParseError('At most %s ids can be requested at once' % MAX_PAGE_SIZE)
+        return ids
+
+    def requested_relations(self, request, endpoint):
+        """The relations named by ?expand=, in TABLE_RELATIONS order so each combination is cached once."""
+        requested = set(name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip())
+        relations = TABLE_RELATIONS.get(endpoint, {})
+        unknown = sorted(requested.difference(relations))
+        if unknown:
+            raise ParseError('Unknown relations: %s' % ', '.join(unknown))
+        return tuple(name for name in relations if name in requested)
+
+    def requested_fields(self, request, table):
+        """
+        The fields named by ?fields=, in the table's own column order so that every spelling
+        of a projection shares one cached payload, or None to return every field.
+        """
+        requested = set(name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip())
+        if not requested:
+            return None
+        unknown = sorted(requested.difference(table.columns))
+        if unknown:
+            raise ParseError('Unknown fields: %s' % ', '.join(unknown))
+        return tuple(name for name in table.columns if name in requested)
+
+    def rows_payload(self, request, table, payload, fields=None):
+        """payload, or its columnar rendering when that is the format asked for."""
+        if isinstance(request.accepted_renderer, ColumnarJSONRenderer):
+            return payload.columnar(fields or table.columns)
+        return payload
+
+    def is_current_version(self, snapshot, *hashes):
+        return self.content_version is None or self.content_version in (snapshot.content_hash, *hashes)
+
+    def current_version_redirect(self, request, content_hash):
+        path = request.get_full_path().replace('/v/%s/' % self.content_version, '/v/%s/' % content_hash, 1)
+        response = HttpResponseRedirect(path)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def payload_response(self, request, payload):
+        renderer = request.accepted_renderer
+        prerendered = isinstance(renderer, MessagePackRenderer) or (
+            isinstance(renderer, JSONRenderer) and 'indent' not in (request.accepted_media_type or ''))
+        if isinstance(renderer, MessagePackRenderer):
+            payload = payload.msgpack
+        if prerendered:
+            # Already rendered when the snapshot was built, skip DRF's renderer
+            encoding = accepted_encoding(request, payload.encodings)
+            etag = payload.etag(encoding)
+            if etag_matches(request, etag):
+                response = HttpResponseNotModified()
+            else:
+                content = payload.encodings[encoding] if encoding else payload.content
+                response = HttpResponse(content, content_type=renderer.media_type, status=status.HTTP_200_OK)
+                if encoding:
+                    response['Content-Encoding'] = encoding
+            response['ETag'] = etag
+            if payload.encodings:
+                patch_vary_headers(response, ('Accept-Encoding',))
+        else:
+            response = Response(payload.data, status=status.HTTP_200_OK)
+        if self.content_version is not None:
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            # Storable, but revalidated against the ETag on every use
+            patch_cache_control(response, no_cache=True)
+        return response
+
+
+class SharedViewset(ReferenceViewset):
 
     @action(detail=True, methods=['get'])
     def regions(self, request, regionId=None):
-        regions = None
         if regionId is None:
-            regions = Regions.objects.all()
-        else:
-            regions = Regions.objects.filter(id=regionId)
-        serializer = RegionsSerializer(regions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.reference_response(request, 'regions')
+        return self.reference_response(request, 'regions', id=regionId)
 
     @action(detail=True, methods=['get'])
     def subregions(self, request, regionId=None, subregionId=None):
-        subregions = None
         if regionId is None:
-            subregions = Subregion.objects.all()
+            return self.reference_response(request, 'subregions')
         elif subregionId is None:
-            subregions = Subregion.objects.filter(regionid=regionId)
-        else:
-            subregions = Subregion.objects.filter(regionid=regionId, id=subregionId)
-        serializer = SubregionSerializer(subregions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.reference_response(request, 'subregions', regionid=regionId)
+        return self.reference_response(request, 'subregions', regionid=regionId, id=subregionId)
 
     @action(detail=True, methods=['get'])
     def nitratecredit(self, request):
-        serializer = NitrateCreditSerializer(NitrateCredit.objects.all(), many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.reference_response(request, 'nitratecredit')
+
+    @action(detail=False, methods=['get'])
+    def manifest(self, request):
+        snapshot = registry.get()
+        if not self.is_current_version(snapshot):
+            return self.current_version_redirect(request, snapshot.content_hash)
+        return self.payload_response(request, snapshot.manifest)
+
+    @action(detail=False, methods=['get'])
+    def bootstrap(self, request):
+        snapshot = registry.get()
+        if not self.is_current_version(snapshot):
+            return self.current_version_redirect(request, snapshot.content_hash)
+        columnar = isinstance(request.accepted_renderer, ColumnarJSONRenderer)
+        tables = request.query_params.get('tables')
+        if tables is None:
+            return self.payload_response(request, snapshot.bundle(columnar=columnar))
+        names = list(dict.fromkeys(name for name in tables.split(',') if name))
+        unknown = [name for name in names if name not in snapshot.tables]
+        if unknown:
+            return Response({'detail': 'Unknown tables: %s' % ', '.join(unknown)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return self.payload_response(request, snapshot.bundle(names, columnar=columnar))
+
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """
+        Takes {"versions": {"<table>": <version>, ...}, "tables": ["<table>", ...]} and returns
+        what changed in those tables since the given versions, see SnapshotRegistry.sync.
+        tables defaults to the bootstrap tables, and tables without a version are sent in full.
+        """
+        if not isinstance(request.data, dict):
+            return Response({'detail': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+        versions = request.data.get('versions', {})
+        names = request.data.get('tables', BOOTSTRAP_TABLES)
+        if not isinstance(versions, dict) or not all(
+                isinstance(version, int) and not isinstance(version, bool) for version in versions.values()):
+            return Response({'detail': 'versions must map table names to integer versions'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(names, (list, tuple)) or not all(isinstance(name, str) for name in names):
+            return Response({'detail': 'tables must be a list of table names'}, status=status.HTTP_400_BAD_REQUEST)
+        names = list(dict.fromkeys(names))
+        unknown = [name for name in names if name not in registry.serializers]
+        if unknown:
+            return Response({'detail': 'Unknown tables: %s' % ', '.join(unknown)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return self.payload_response(request, registry.sync(versions, names))
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Takes {"requests": ["cropyields/12/3/", "subregions/2/", ...]}, paths of GET routes
+        under /api/, and runs them all in this one request. The results come back in the same
+        order as {"results": [{"path", "status", "headers", "body"}, ...]}; body is null unless
+        the sub-response is JSON.
+        """
+        paths = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+            return Response({'detail': 'requests must be a list of paths'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(paths) > MAX_BATCH_SIZE:
+            return Response({'detail': 'At most %s requests can be batched' % MAX_BATCH_SIZE},
+                            status=status.HTTP_400_BAD_REQUEST)
+        results = []
+        for path in paths:
+            response = batch_subrequest(request._request, path)
+            headers = {name: response[name] for name in BATCH_RESULT_HEADERS if name in response}
+            is_json = response.get('Content-Type', '').startswith('application/json') and response.content
+            results.append(b'{"path":%s,"status":%d,"headers":%s,"body":%s}' % (
+                render_json(path), response.status_code, render_json(headers),
+                response.content if is_json else b'null'))
+        return self.payload_response(request, Payload.rendered(b'{"results":[%s]}' % b','.join(results)))
+
+    @action(detail=True, methods=['get'])
+    def regionBootstrap(self, request, regionId=None):
+        snapshot = registry.get()
+        if not self.is_current_version(snapshot):
+            return self.current_version_redirect(request, snapshot.content_hash)
+        columnar = isinstance(request.accepted_renderer, ColumnarJSONRenderer)
+        return self.payload_response(request, snapshot.region_bundle(regionId, columnar=columnar))
@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# runserver serves the admin's static files in development, uvicorn needs this instead
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
+
+# Load the reference data snapshot at startup rather than during the first request. uvicorn
+# imports this inside its event loop, where the database can't be queried, so on a thread.
+# /healthcheck/ready/ answers 503 until it is loaded.
+from apps.shared.snapshot import registry  # noqa: E402  pylint: disable=wrong-import-position
+
+registry.warm_in_background()
@@ -67,10 +67,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'apps.shared.middleware.ConcurrencyLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Public reference routes skip everything below (apps/shared/middleware.py)
+    'apps.shared.middleware.ReferenceFastLaneMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -78,6 +80,16 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware',
 ]
 
+# Per-worker cap on concurrent requests (apps/shared/middleware.py). It adapts between MIN and
+# MAX to keep reference lookups under LATENCY_TARGET seconds; requests over it wait up to
+# QUEUE_TIMEOUT seconds for a slot before getting a 503.
+CONCURRENCY_LIMIT_INITIAL = 20
+CONCURRENCY_LIMIT_MIN = 2
+CONCURRENCY_LIMIT_MAX = 200
+CONCURRENCY_LIMIT_LATENCY_TARGET = 0.25
+CONCURRENCY_LIMIT_QUEUE_TIMEOUT = 0.05
+CONCURRENCY_LIMIT_EXEMPT_PATHS = ['/healthcheck/']
+
 # Django REST
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.AllowAny",),
@@ -89,7 +101,38 @@ REST_FRAMEWORK = {
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ),
+    # Token buckets per client, and per route for all clients together ("<scope>_total")
+    "DEFAULT_THROTTLE_CLASSES": ("apps.shared.throttling.TokenBucketThrottle",),
+    "DEFAULT_THROTTLE_RATES": {
+        "batch": "60/min",
+        "batch_total": "1200/min",
+        "sync": "60/min",
+        "sync_total": "1200/min",
+    },
 }
+# Cache alias to share throttle buckets between workers through, or None to keep them per worker
+THROTTLE_CACHE = None
+
+# Reference data snapshot (apps/shared/snapshot.py). When a path is set, the snapshot is written
+# there after every build and workers memory-map it instead of loading their own copy. Only the
+# full-table bodies are shared; filtered and projected responses are still built per worker.
+REFERENCE_SNAPSHOT_PATH = os.getenv('REFERENCE_SNAPSHOT_PATH')
+# Seconds between checks for a snapshot file rewritten by another worker
+REFERENCE_SNAPSHOT_CHECK_INTERVAL = 5
+# Snapshot builds that fail, or take more than REFERENCE_DB_SLOW_CALL seconds, this many times
+# in a row stop builds for REFERENCE_DB_RESET_TIMEOUT seconds. The last good snapshot is
+# served meanwhile, with an X-Snapshot-Stale header.
+REFERENCE_DB_FAILURE_THRESHOLD = 3
+REFERENCE_DB_SLOW_CALL = 5
+REFERENCE_DB_RESET_TIMEOUT = 30
+# Seconds a query reading the reference tables for the snapshot may run before PostgreSQL
+# cancels it, so that a stalled database fails the build rather than hanging it
+REFERENCE_DB_STATEMENT_TIMEOUT = 30
+# Seconds a request waits on a payload build, or on the first snapshot load, already running
+# for another request before it builds the payload itself (or answers 503)
+REFERENCE_COALESCE_TIMEOUT = 10
+# Seconds between the database pings reported by /healthcheck/ready/, however often it's probed
+HEALTHCHECK_DB_PING_INTERVAL = 10
 
 ROOT_URLCONF = 'config.urls'
 
@@ -113,6 +156,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 
 # Database
@@ -126,6 +170,8 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST'),
         'PORT': os.getenv('POSTGRES_PORT'),
+        # Fail over quickly rather than holding requests while the database is unreachable
+        'OPTIONS': {'connect_timeout': 5},
     }
 }
 
@@ -192,6 +238,14 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 ]
 
+# Pagination cursors and missing ids on the reference routes, readable by the frontend
+CORS_EXPOSE_HEADERS = [
+    "Link",
+    "X-Next-Cursor",
+    "X-Missing-Ids",
+    "X-Snapshot-Stale",
+]
+
 CSRF_TRUSTED_ORIGINS = [
     "https://nr-nmp-test-backend.apps.silver.devops.gov.bc.ca",
 ]
@@ -17,7 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic.base import RedirectView
-from apps.admin.views import health_check
+from apps.admin.views import health_check, liveness, readiness
+from apps.shared.urls import reference_urlpatterns
 
 urlpatterns = [
     path('', RedirectView.as_view(url='accounts/login', permanent=True)),
@@ -26,9 +27,18 @@ urlpatterns = [
     # TODO: make a better accounts/login page
     path('accounts/', include('allauth.urls')),
     path('healthcheck/', health_check),
+    path('healthcheck/live/', liveness),
+    path('healthcheck/ready/', readiness),
     path('api/', include('apps.animals.urls')),
     path('api/', include('apps.crops.urls')),
     path('api/', include('apps.shared.urls')),
     path('api/', include('apps.manures.urls')),
     path('api/', include('apps.fertilizers.urls')),
+    # Same GET routes addressed by content hash (see /api/manifest/), cacheable as immutable.
+    # Not sync/ or batch/, which are POSTs answered with the current data whatever the URL says.
+    path('api/v/<str:content_version>/', include('apps.animals.urls')),
+    path('api/v/<str:content_version>/', include('apps.crops.urls')),
+    path('api/v/<str:content_version>/', include(reference_urlpatterns)),
+    path('api/v/<str:content_version>/', include('apps.manures.urls')),
+    path('api/v/<str:content_version>/', include('apps.fertilizers.urls')),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Load the reference data snapshot at startup rather than during the first request
+from apps.shared.snapshot import registry  # noqa: E402  pylint: disable=wrong-import-position
+
+registry.warm()
@@ -36,18 +36,16 @@ class APICache {
   public promise: Promise<null>;
 
   private async initialize() {
-    await Promise.all(
-      InitialEndpoints.map((endpoint) =>
-        axiosGet(`${env.VITE_BACKEND_URL}/api/${endpoint}/`).then((res) => {
-          if (res.status === 200) {
-            this.endpointCache[endpoint] = res;
-          }
-          // TODO: Handle errors here
-        }),
-      ),
-    ).then(() => {
-      this.initialized = true;
+    // All the initial tables come back in one bundle keyed by endpoint name
+    await axiosGet(`${env.VITE_BACKEND_URL}/api/bootstrap/`).then((res) => {
+      if (res.status === 200) {
+        InitialEndpoints.forEach((endpoint) => {
+          this.endpointCache[endpoint] = { ...res, data: res.data[endpoint] };
+        });
+      }
+      // TODO: Handle errors here
     });
+    this.initialized = true;
     return null;
   }
 